@@ -3,11 +3,11 @@ Analytics API Endpoints.
 Handles CSV upload, AI queries, and automated insights.
 """
 
-from fastapi import APIRouter, UploadFile, File, HTTPException, status
+from fastapi import APIRouter, UploadFile, File, HTTPException, Request, Response, status
 from fastapi.responses import FileResponse
 from typing import List
 
-from app.services.data_analyst import DataAnalystService
+from app.services.data_analyst import get_data_analyst_service
 from app.utils.file_handler import FileHandler
 from app.utils.logger import logger
 from app.models.schemas import (
@@ -42,13 +42,12 @@ async def upload_csv(
     file_handler = FileHandler()
     session_id = file_handler.session_id
     
-    # Save file
-    content = await file.read()
-    await file_handler.save_upload_file(content, file.filename)
+    # Stream file to disk
+    await file_handler.save_upload_stream(file, file.filename)
     
     # Init service to validate load
     try:
-        service = DataAnalystService(session_id)
+        service = get_data_analyst_service(session_id)
         if service.df is None:
              raise HTTPException(status_code=400, detail="Failed to load CSV data.")
     except Exception as e:
@@ -75,7 +74,7 @@ async def ask_question(session_id: str, request: AnalyticsQueryRequest):
     if not FileHandler.session_exists(session_id):
         raise HTTPException(status_code=404, detail="Session not found")
         
-    service = DataAnalystService(session_id)
+    service = get_data_analyst_service(session_id)
     result = await service.analyze_query(request.question)
     
     if not result["success"]:
@@ -102,7 +101,7 @@ async def get_insights(session_id: str):
     if not FileHandler.session_exists(session_id):
         raise HTTPException(status_code=404, detail="Session not found")
         
-    service = DataAnalystService(session_id)
+    service = get_data_analyst_service(session_id)
     result = await service.generate_automated_insights()
     
     if not result["success"]:
@@ -120,9 +119,12 @@ async def get_insights(session_id: str):
     summary="Get Generated Chart",
     description="Download/View the latest generated chart HTML."
 )
-async def get_chart(session_id: str):
+async def get_chart(session_id: str, request: Request):
     """
     Retrieve the generated chart HTML file.
+    
+    New charts are renamed into place, so the file's mtime and size identify its
+    content. Clients revalidate with If-None-Match and get a 304 when unchanged.
     """
     if not FileHandler.session_exists(session_id):
         raise HTTPException(status_code=404, detail="Session not found")
@@ -130,10 +132,19 @@ async def get_chart(session_id: str):
     file_handler = FileHandler(session_id)
     chart_path = file_handler.get_visualization_file()
     
-    if not chart_path.exists():
+    try:
+        stat_result = chart_path.stat()
+    except FileNotFoundError:
         raise HTTPException(status_code=404, detail="No chart found for this session.")
+    
+    headers = {
+        "ETag": f'"{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"',
+        "Cache-Control": "no-cache"
+    }
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
         
-    return FileResponse(chart_path)
+    return FileResponse(chart_path, headers=headers, stat_result=stat_result)
 
 
 @router.get(
@@ -3,6 +3,7 @@ Invoice Endpoints.
 Handles invoice upload and processing operations.
 """
 
+import asyncio
 from typing import List
 from fastapi import APIRouter, UploadFile, File, HTTPException, status
 
@@ -21,6 +22,14 @@ from app.config.settings import settings
 router = APIRouter()
 
 
+# Leading bytes of each supported image format, used to validate uploads without decoding them
+IMAGE_SIGNATURES = {
+    "jpg": b"\xff\xd8\xff",
+    "jpeg": b"\xff\xd8\xff",
+    "png": b"\x89PNG\r\n\x1a\n",
+}
+
+
 @router.post(
     "/upload",
     response_model=UploadResponse,
@@ -57,27 +66,40 @@ async def upload_invoices(
                 detail=f"File '{file.filename}' has unsupported extension. Allowed: {', '.join(allowed_extensions)}"
             )
         
-        # Check file size
-        content = await file.read()
-        if len(content) > settings.max_upload_size_mb * 1024 * 1024:
+        # Check file size without buffering the upload
+        if file.size is not None:
+            size = file.size
+        else:
+            size = len(await file.read())
+        if size > settings.max_upload_size_mb * 1024 * 1024:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"File '{file.filename}' exceeds maximum size of {settings.max_upload_size_mb}MB"
             )
         
-        # Reset file position for later reading
+        # Cheap header sniff instead of a full image decode
+        signature = IMAGE_SIGNATURES.get(ext)
         await file.seek(0)
-        uploaded_files.append((file.filename, content))
+        if signature and not (await file.read(len(signature))).startswith(signature):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"File '{file.filename}' is not a valid {ext.upper()} image"
+            )
+        
+        uploaded_files.append(file)
     
     # Create new session
     file_handler = FileHandler()
     session_id = file_handler.session_id
     
-    # Save files
-    saved_filenames = []
-    for filename, content in uploaded_files:
-        await file_handler.save_upload_file(content, filename)
-        saved_filenames.append(filename)
+    # Stream files to disk concurrently (disk writes are I/O-bound); names that would
+    # collide get a suffix so no two writes share a path
+    target_names = file_handler.unique_upload_names([file.filename for file in uploaded_files])
+    await asyncio.gather(*(
+        file_handler.save_upload_stream(file, name)
+        for file, name in zip(uploaded_files, target_names)
+    ))
+    saved_filenames = target_names
     
     # Save session metadata
     file_handler.save_metadata({
@@ -21,11 +21,12 @@ router = APIRouter()
     summary="Generate Analytics Report",
     description="Generate an AI-powered analytics report from uploaded invoices."
 )
-async def generate_report(session_id: str):
+async def generate_report(session_id: str, regenerate: bool = False):
     """
     Generate an analytics report using Gemini AI.
     
     - **session_id**: Session ID from upload step
+    - **regenerate**: Ask for a fresh report instead of reusing the stored response
     - Returns a detailed markdown report with spending trends and insights
     """
     # Check if session exists
@@ -38,7 +39,7 @@ async def generate_report(session_id: str):
     try:
         # Generate report
         generator = ReportGenerator(session_id)
-        report_text = await generator.generate_report()
+        report_text = await generator.generate_report(regenerate=regenerate)
         
         # Update session metadata
         file_handler = FileHandler(session_id)
@@ -6,6 +6,8 @@ Handles session management operations.
 from fastapi import APIRouter, HTTPException, status
 
 from app.models.schemas import SessionResponse, SessionListResponse, MessageResponse, ErrorResponse
+from app.services.data_analyst import clear_data_analyst_services
+from app.services.visualization_service import clear_chart_cache
 from app.utils.file_handler import FileHandler
 from app.utils.logger import logger
 
@@ -108,6 +110,8 @@ async def delete_session(session_id: str):
     
     try:
         FileHandler.cleanup_session(session_id)
+        clear_data_analyst_services(session_id)
+        clear_chart_cache(session_id)
         logger.info(f"Session {session_id}: Deleted successfully")
         
         return MessageResponse(
@@ -145,6 +149,8 @@ async def delete_all_sessions():
         except Exception as e:
             logger.warning(f"Failed to delete session {sid}: {e}")
     
+    clear_data_analyst_services()
+    clear_chart_cache()
     logger.info(f"Deleted {deleted_count} sessions")
     
     return MessageResponse(
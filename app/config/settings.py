@@ -23,6 +23,7 @@ class Settings(BaseSettings):
     # Google Gemini API
     google_api_key: str = Field(os.getenv("GOOGLE_API_KEY"), description="Google Gemini API Key")
     gemini_model: str = Field(default="gemini-2.0-flash", description="Gemini model name")
+    gemini_max_concurrency: int = Field(default=8, description="Maximum concurrent async Gemini requests")
     
     # Server Configuration
     host: str = Field(default="0.0.0.0", description="Server host")
@@ -45,6 +46,22 @@ class Settings(BaseSettings):
         default=["jpg", "jpeg", "png"],
         description="Allowed file extensions for upload"
     )
+    max_image_edge_px: int = Field(
+        default=1600,
+        description="Invoice images with a longer edge are downscaled before upload (0 disables)"
+    )
+    llm_cache_enabled: bool = Field(
+        default=True,
+        description="Reuse stored Gemini responses for identical prompts and invoice files"
+    )
+    llm_cache_ttl_hours: int = Field(
+        default=24,
+        description="Stored Gemini responses older than this are discarded"
+    )
+    llm_cache_max_entries: int = Field(
+        default=32,
+        description="Maximum stored Gemini responses per session (oldest are evicted)"
+    )
     
     class Config:
         env_file = ".env"
@@ -9,6 +9,7 @@ from fastapi.middleware.cors import CORSMiddleware
 
 from app.config.settings import settings
 from app.api.v1.router import api_router
+from app.services.gemini_service import get_gemini_service
 
 
 @asynccontextmanager
@@ -26,6 +27,8 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     print("👋 Shutting down Invoice Analyzer API...")
+    if get_gemini_service.cache_info().currsize:
+        await get_gemini_service().aclose()  # Release pooled keep-alive connections
 
 
 # Create FastAPI application
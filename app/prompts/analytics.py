@@ -51,10 +51,10 @@ def get_code_generation_prompt(df_info: Dict[str, Any], question: str, chart_pat
     return f"""You are an expert data analyst. Generate Python code to answer this question about the dataset.
 
 Dataset Information:
-- Columns: {', '.join(df_info.get('columns', []))}
 - Shape: {df_info.get('shape', 'Unknown')}
-- Data types: {json.dumps(df_info.get('dtypes', {}), indent=2)}
-- Preview: {json.dumps(df_info.get('preview', []), indent=2)}
+- Columns (name:type): {df_info.get('schema', '')}
+- Preview (CSV):
+{df_info.get('preview_csv', '')}
 
 User Question: {question}
 
@@ -20,9 +20,7 @@ Fields to Extract (Key mappings):
 - "total_price": Total line item amount (Number).
 
 Quality Control:
-- Ensure all numbers are floats or integers.
 - quantity * unit_price should approximately equal total_price.
-- If unit_price is missing but quantity/total are there, calculate it.
 - Convert dates to strict YYYY-MM-DD format.
 
 Example Output:
@@ -4,17 +4,21 @@ Integrates the AI Data Analyst capabilities for advanced data querying and visua
 Uses Gemini to generate Python code for analysis and executes it safely.
 """
 
+import ast
 import json
 import traceback
 from datetime import datetime
+from functools import lru_cache
+from types import CodeType
 import pandas as pd
+import pyarrow as pa
 import plotly.express as px
 import plotly.graph_objects as go
 from pathlib import Path
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, Optional, Tuple
 
 from app.services.gemini_service import get_gemini_service
-from app.utils.file_handler import FileHandler
+from app.utils.file_handler import FileHandler, read_csv
 from app.utils.logger import logger
 from app.prompts.analytics import (
     get_code_generation_prompt,
@@ -23,6 +27,150 @@ from app.prompts.analytics import (
 )
 
 
+# DataFrame methods that always modify the frame they are called on (pipe hands it to a callable)
+_MUTATING_METHODS = {'insert', 'pop', 'update', 'pipe', '__setitem__', '__delitem__'}
+
+# Builtins that may receive df without modifying it
+_READ_ONLY_CALLS = {'len', 'print', 'repr', 'str', 'type', 'isinstance'}
+
+
+def _root_name(node: ast.AST) -> Optional[str]:
+    """Return the variable name at the base of an attribute/subscript chain (e.g. 'df' for df.loc[0, 'a'])."""
+    while isinstance(node, (ast.Attribute, ast.Subscript)):
+        node = node.value
+    return node.id if isinstance(node, ast.Name) else None
+
+
+def _is_alias(node: ast.AST, aliases: set) -> bool:
+    """Whether node is a bare read of df or an alias (unwrapping *args)."""
+    if isinstance(node, ast.Starred):
+        node = node.value
+    return isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load) and node.id in aliases
+
+
+def _may_modify_df(tree: ast.AST) -> bool:
+    """
+    Conservative check whether code may modify 'df' in place.
+    
+    Flags item/attribute assignment or deletion on 'df' (or a plain alias of it),
+    in-place methods, any call passing inplace=True, and every way df can escape to
+    code that might modify it: passed as a call argument, stored in a container, or
+    referenced from a lambda or function definition.
+    """
+    nodes = list(ast.walk(tree))
+    
+    # Names bound directly to df (d = df, or d := df) refer to the same object
+    aliases = {'df'}
+    changed = True
+    while changed:
+        changed = False
+        for node in nodes:
+            if isinstance(node, ast.Assign) and _is_alias(node.value, aliases):
+                targets = node.targets
+            elif isinstance(node, ast.NamedExpr) and _is_alias(node.value, aliases):
+                targets = [node.target]
+            else:
+                continue
+            for target in targets:
+                if isinstance(target, ast.Name) and target.id not in aliases:
+                    aliases.add(target.id)
+                    changed = True
+    
+    for node in nodes:
+        if isinstance(node, (ast.Assign, ast.AugAssign, ast.AnnAssign, ast.Delete)):
+            targets = node.targets if isinstance(node, (ast.Assign, ast.Delete)) else [node.target]
+            for target in targets:
+                elements = target.elts if isinstance(target, (ast.Tuple, ast.List)) else [target]
+                for element in elements:
+                    if isinstance(element, (ast.Attribute, ast.Subscript)) and _root_name(element) in aliases:
+                        return True
+        elif isinstance(node, ast.Attribute):
+            # Covers bound methods taken without calling them (m = df.insert)
+            if node.attr in _MUTATING_METHODS and _root_name(node.value) in aliases:
+                return True
+        elif isinstance(node, ast.Call):
+            for keyword in node.keywords:
+                if keyword.arg == 'inplace' and not (
+                    isinstance(keyword.value, ast.Constant) and keyword.value.value is False
+                ):
+                    return True
+            if isinstance(node.func, ast.Name) and node.func.id in _READ_ONLY_CALLS:
+                continue
+            arguments = [*node.args, *(keyword.value for keyword in node.keywords)]
+            if any(_is_alias(argument, aliases) for argument in arguments):
+                return True
+        elif isinstance(node, (ast.List, ast.Tuple, ast.Set)):
+            if any(_is_alias(element, aliases) for element in node.elts):
+                return True
+        elif isinstance(node, ast.Dict):
+            if any(value is not None and _is_alias(value, aliases) for value in [*node.keys, *node.values]):
+                return True
+        elif isinstance(node, (ast.Lambda, ast.FunctionDef, ast.AsyncFunctionDef)):
+            if any(_is_alias(inner, aliases) for inner in ast.walk(node)):
+                return True
+    return False
+
+
+# Summary statistics keyed by data source fingerprint (path, mtime_ns)
+_SUMMARY_CACHE: Dict[Tuple[str, int], Dict[str, Any]] = {}
+_SUMMARY_CACHE_SIZE = 16
+
+# Loaded analysis DataFrames keyed by data source fingerprint (path, mtime_ns)
+_FRAME_CACHE: Dict[Tuple[str, int], pd.DataFrame] = {}
+_FRAME_CACHE_SIZE = 8
+
+
+def _downcast(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Narrow column dtypes in place to cut memory and bandwidth for later reductions.
+    
+    Floats shrink to float32 when no precision is lost. Integers stay int64: Arrow
+    integer arithmetic raises on overflow, so narrower types would break cumsum(),
+    sums and products in generated code. String columns stay Arrow-backed strings:
+    categoricals would break string concatenation and assignment of new values.
+    """
+    before = df.memory_usage(deep=True).sum()
+    
+    for col in df.select_dtypes(include='float').columns:
+        narrowed = pd.to_numeric(df[col], downcast='float')
+        # Arrow-backed floats are narrowed unconditionally, so verify the round trip
+        if narrowed.astype(df[col].dtype).equals(df[col]):
+            df[col] = narrowed
+    
+    after = df.memory_usage(deep=True).sum()
+    logger.info(f"Downcast DataFrame memory: {before / 1024:.1f} KiB -> {after / 1024:.1f} KiB")
+    return df
+
+
+def _load_analysis_frame(path: str, mtime_ns: int) -> pd.DataFrame:
+    """Load a CSV with Arrow dtypes and downcast it, once per file version."""
+    key = (path, mtime_ns)
+    df = _FRAME_CACHE.pop(key, None)
+    if df is None:
+        df = read_csv(Path(path), dtype_backend='pyarrow')
+        for col, dtype in df.dtypes.items():
+            # The Arrow engine reads ISO dates as date32, which to_json cannot serialize
+            if isinstance(dtype, pd.ArrowDtype) and pa.types.is_date(dtype.pyarrow_dtype):
+                df[col] = df[col].astype('datetime64[ns]')
+        df = _downcast(df)
+        if len(_FRAME_CACHE) >= _FRAME_CACHE_SIZE:
+            _FRAME_CACHE.pop(next(iter(_FRAME_CACHE)))  # Evict the least recently used entry
+    _FRAME_CACHE[key] = df
+    return df
+
+
+@lru_cache(maxsize=128)
+def _compile_code(code: str) -> Tuple[CodeType, bool]:
+    """
+    Parse and compile generated code once per unique source.
+    
+    Returns:
+        The compiled code object and whether it may modify 'df' in place.
+    """
+    tree = ast.parse(code)
+    return compile(tree, '<analysis>', 'exec'), _may_modify_df(tree)
+
+
 class DataAnalystService:
     """
     Service for AI-powered data analysis.
@@ -41,6 +189,7 @@ class DataAnalystService:
         self.gemini = get_gemini_service()
         self.df: Optional[pd.DataFrame] = None
         self.df_info: Optional[Dict[str, Any]] = None
+        self._fingerprint: Optional[Tuple[str, int]] = None
         
         # Load data immediately if available
         self._load_data()
@@ -57,17 +206,22 @@ class DataAnalystService:
         if upload_dir.exists():
             for file in upload_dir.glob("*.csv"):
                 try:
-                    self.df = pd.read_csv(file)
+                    self._fingerprint = (str(file), file.stat().st_mtime_ns)
+                    self.df = _load_analysis_frame(*self._fingerprint)
                     logger.info(f"Loaded custom CSV: {file.name}")
                     break
                 except Exception as e:
+                    self._fingerprint = None
                     logger.warning(f"Failed to load CSV {file.name}: {e}")
         
         # 2. If no custom CSV, try processed invoice data
-        if self.df is None:
-            invoice_data = self.file_handler.load_invoice_data()
-            if invoice_data:
-                self.df = pd.DataFrame(invoice_data)
+        data_file = self.file_handler.get_data_file()
+        if self.df is None and data_file.exists():
+            fingerprint = (str(data_file), data_file.stat().st_mtime_ns)
+            invoice_df = _load_analysis_frame(*fingerprint)
+            if not invoice_df.empty:
+                self.df = invoice_df
+                self._fingerprint = fingerprint
                 logger.info("Loaded processed invoice data")
         
         # Prepare DataFrame Info if loaded
@@ -77,16 +231,14 @@ class DataAnalystService:
     def _prepare_df_info(self):
         """Prepare metadata about the DataFrame for the AI."""
         try:
-            # Convert datetime columns to string for JSON serialization compatibility
-            df_preview = self.df.head(5).copy()
-            for col in df_preview.select_dtypes(include=['datetime64', 'datetime']).columns:
-                df_preview[col] = df_preview[col].astype(str)
-                
+            # Only the fields the code generation prompt reads
             self.df_info = {
-                "columns": list(self.df.columns),
                 "shape": self.df.shape,
-                "dtypes": {col: str(dtype) for col, dtype in self.df.dtypes.items()},
-                "preview": df_preview.to_dict(orient='records')
+                "schema": ", ".join(
+                    f"{col}:{dtype.pyarrow_dtype if isinstance(dtype, pd.ArrowDtype) else dtype}"
+                    for col, dtype in self.df.dtypes.items()
+                ),
+                "preview_csv": self.df.head(3).to_csv(index=False)
             }
         except Exception as e:
             logger.error(f"Error preparing DataFrame info: {e}")
@@ -103,15 +255,18 @@ class DataAnalystService:
             }
             
         try:
+            # Each question gets its own chart path so concurrent requests never share a file
+            chart_path = self.file_handler.new_visualization_file()
+            
             # Step 1: Generate Python Code
-            code_response = await self._generate_code(user_question)
+            code_response = await self._generate_code(user_question, chart_path)
             if not code_response["success"]:
                 return code_response
             
             generated_code = code_response["code"]
             
             # Step 2: Execute Code
-            execution_result = self._execute_code(generated_code)
+            execution_result = self._execute_code(generated_code, chart_path)
             if not execution_result["success"]:
                 return execution_result
                 
@@ -154,12 +309,12 @@ class DataAnalystService:
             logger.error(f"Analysis failed: {e}")
             return {"success": False, "error": f"Analysis failed: {str(e)}"}
 
-    async def _generate_code(self, question: str) -> Dict[str, Any]:
+    async def _generate_code(self, question: str, chart_path: Path) -> Dict[str, Any]:
         """Generate Python code using Gemini."""
         prompt = get_code_generation_prompt(
             df_info=self.df_info,
             question=question,
-            chart_path=str(self.file_handler.get_visualization_file())
+            chart_path=str(chart_path)
         )
         try:
             # Use our existing GeminiService
@@ -176,19 +331,30 @@ class DataAnalystService:
         except Exception as e:
             return {"success": False, "error": f"Code generation failed: {e}"}
 
-    def _execute_code(self, code: str) -> Dict[str, Any]:
-        """Execute the generated Python code safely."""
+    def _execute_code(self, code: str, chart_path: Optional[Path] = None) -> Dict[str, Any]:
+        """
+        Execute the generated Python code safely.
+        
+        Args:
+            code: Generated Python source
+            chart_path: Per-execution path the code was told to write its chart HTML to
+            
+        Returns:
+            Execution result with the stringified 'result' and any Plotly figure JSON
+        """
         try:
-            # Prepare execution environment
+            compiled, modifies_df = _compile_code(code)
+            
+            # Read-only code works on the loaded frame directly; copy only when it writes to df
             namespace = {
-                'df': self.df.copy(),
+                'df': self.df.copy() if modifies_df else self.df,
                 'pd': pd,
                 'px': px,
                 'go': go,
                 'result': None
             }
             
-            exec(code, namespace)
+            exec(compiled, namespace)
             
             result_data = namespace.get('result')
             # Check if a figure object exists in the namespace (generated by px or go)
@@ -201,9 +367,12 @@ class DataAnalystService:
             possible_figs = [namespace.get('fig'), namespace.get('chart'), namespace.get('result')]
             
             for obj in possible_figs:
-                 if hasattr(obj, 'to_json'):
-                     chart_json = obj.to_json()
-                     break
+                if isinstance(obj, go.Figure):
+                    chart_json = obj.to_json()
+                    break
+            
+            if chart_path is not None:
+                self._publish_chart(chart_path)
             
             return {
                 "success": True,
@@ -211,12 +380,21 @@ class DataAnalystService:
                 "visualization": chart_json 
             }
         except Exception as e:
+            if chart_path is not None:
+                chart_path.unlink(missing_ok=True)
             return {
                 "success": False,
                 "error": f"Code execution failed: {e}",
                 "traceback": traceback.format_exc()
             }
 
+    def _publish_chart(self, chart_path: Path) -> None:
+        """Atomically make a chart written by this execution the session's latest chart."""
+        try:
+            chart_path.replace(self.file_handler.get_visualization_file())
+        except FileNotFoundError:
+            pass  # This execution did not write a chart; keep the previous one
+
     async def _generate_explanation(self, question: str, code: str, result: Dict) -> str:
         """Generate a natural language explanation of the findings."""
         prompt = get_explanation_prompt(
@@ -269,7 +447,82 @@ class DataAnalystService:
             }
 
     def _calculate_summary_stats(self) -> Dict[str, Any]:
-        """Calculate basic DF stats to feed to LLM."""
-        desc = self.df.describe(include='all').to_dict()
+        """Calculate basic DF stats to feed to LLM (memoized per data file version)."""
+        cached = _SUMMARY_CACHE.get(self._fingerprint) if self._fingerprint else None
+        if cached is not None:
+            return cached
+        
+        numeric_df = self.df.select_dtypes(include='number')
+        desc = numeric_df.describe().to_dict() if not numeric_df.empty else {}
         # Simplify for token usage...
-        return {"shape": self.df.shape, "columns": list(self.df.columns), "description": str(desc)[:1000]} # Truncate for safety
+        summary = {"shape": self.df.shape, "columns": list(self.df.columns), "description": str(desc)[:1000]} # Truncate for safety
+        summary["categorical_columns"] = self._summarize_categorical_columns()
+        
+        if self._fingerprint:
+            if len(_SUMMARY_CACHE) >= _SUMMARY_CACHE_SIZE:
+                _SUMMARY_CACHE.pop(next(iter(_SUMMARY_CACHE)))  # Evict the oldest entry
+            _SUMMARY_CACHE[self._fingerprint] = summary
+        return summary
+
+    def _summarize_categorical_columns(self, top_n: int = 10) -> Dict[str, Dict[str, Any]]:
+        """Summarize non-numeric columns with a single value_counts pass per column."""
+        result = {}
+        for col in self.df.select_dtypes(exclude=['number', 'datetime']).columns:
+            # unique count, top values and mode all come from the same counts
+            vc = self.df[col].value_counts(dropna=False, sort=False)
+            top = vc.nlargest(top_n)
+            result[col] = {
+                "unique_count": int(vc.size),
+                "top_values": {str(k): int(v) for k, v in top.items()},
+                "most_common": str(top.index[0]) if vc.size else None,
+            }
+        return result
+
+
+# Service instances keyed by (session, data version)
+_SERVICE_CACHE: Dict[Tuple[str, Tuple[Tuple[str, int], ...]], DataAnalystService] = {}
+_SERVICE_CACHE_SIZE = 8
+
+
+def get_data_analyst_service(session_id: str) -> DataAnalystService:
+    """
+    Retrieve a DataAnalystService for the session.
+    
+    Instances are cached per session and reused while the session's data files are
+    unchanged, so repeated questions skip loading and preparing the DataFrame.
+    
+    Args:
+        session_id: Unique session identifier
+        
+    Returns:
+        DataAnalystService: The cached service instance.
+    """
+    key = (session_id, FileHandler(session_id).get_data_version())
+    service = _SERVICE_CACHE.pop(key, None)
+    if service is None:
+        service = DataAnalystService(session_id)
+        if len(_SERVICE_CACHE) >= _SERVICE_CACHE_SIZE:
+            _SERVICE_CACHE.pop(next(iter(_SERVICE_CACHE)))  # Evict the least recently used entry
+    _SERVICE_CACHE[key] = service
+    return service
+
+
+def clear_data_analyst_services(session_id: Optional[str] = None):
+    """
+    Drop cached DataAnalystService instances and analysis data (e.g. after sessions are deleted).
+    
+    Args:
+        session_id: Only drop entries belonging to this session; all entries when None
+    """
+    if session_id is None:
+        _SERVICE_CACHE.clear()
+        _FRAME_CACHE.clear()
+        _SUMMARY_CACHE.clear()
+        return
+    
+    for key in [key for key in _SERVICE_CACHE if key[0] == session_id]:
+        del _SERVICE_CACHE[key]
+    # Data caches are keyed by file path, which lies under storage/sessions/<session_id>/
+    for cache in (_FRAME_CACHE, _SUMMARY_CACHE):
+        for key in [key for key in cache if session_id in Path(key[0]).parts]:
+            del cache[key]
@@ -8,9 +8,9 @@ including automatic retries with exponential backoff for network resilience.
 
 import asyncio
 from functools import lru_cache
-from typing import Optional, List
+from typing import AsyncIterator, Optional, List
 
-from PIL import Image
+import httpx
 from google import genai
 from google.genai import types
 
@@ -18,6 +18,15 @@ from app.config.settings import settings
 from app.utils.logger import logger
 
 
+@lru_cache(maxsize=16)
+def _generation_config(temperature: float, max_output_tokens: int) -> types.GenerateContentConfig:
+    """Build a generation config; callers use a handful of fixed settings, so each is built once."""
+    return types.GenerateContentConfig(
+        temperature=temperature,
+        max_output_tokens=max_output_tokens,
+    )
+
+
 class GeminiService:
     """
     Service class for managing Google Gemini AI interactions.
@@ -33,14 +42,29 @@ class GeminiService:
         
         Using the API key from application settings.
         """
-        self.client = genai.Client(api_key=settings.google_api_key)
+        # Keep enough idle connections alive for a full round of concurrent requests, so
+        # repeated calls reuse warm TLS connections instead of handshaking again
+        limits = httpx.Limits(
+            max_connections=settings.gemini_max_concurrency * 2,
+            max_keepalive_connections=settings.gemini_max_concurrency,
+            keepalive_expiry=60,
+        )
+        self.client = genai.Client(
+            api_key=settings.google_api_key,
+            http_options=types.HttpOptions(
+                client_args={"limits": limits},
+                async_client_args={"limits": limits},
+            ),
+        )
         self.model = settings.gemini_model
+        # Caps in-flight async requests across all sessions (invoice batches are fired with gather)
+        self._request_slots = asyncio.Semaphore(settings.gemini_max_concurrency)
         logger.info(f"GeminiService initialized with model: {self.model}")
     
     async def generate_content(
         self,
         prompt: str,
-        images: Optional[List[Image.Image]] = None,
+        images: Optional[List[types.Part]] = None,
         temperature: float = 0.7,
         max_output_tokens: int = 8192,
         max_retries: int = 3,
@@ -49,10 +73,12 @@ class GeminiService:
         Generate content asynchronously using the Gemini model.
         
         Includes built-in retry logic with exponential backoff to handle transient API errors.
+        At most `gemini_max_concurrency` requests are in flight at once; backoff sleeps do
+        not hold a slot.
         
         Args:
             prompt (str): The text instruction for the model.
-            images (Optional[List[Image.Image]]): Optional list of PIL Image objects to include in the context.
+            images (Optional[List[types.Part]]): Optional inline image parts to include in the context.
             temperature (float): Controls randomness (0.0 to 1.0). Lower is more deterministic.
             max_output_tokens (int): Maximum number of tokens allowed in the response.
             max_retries (int): Maximum number of retry attempts for failed API calls.
@@ -69,20 +95,18 @@ class GeminiService:
             request_contents.extend(images)
         request_contents.append(prompt)
             
-        generation_config = types.GenerateContentConfig(
-            temperature=temperature,
-            max_output_tokens=max_output_tokens
-        )
+        generation_config = _generation_config(temperature, max_output_tokens)
         
         last_exception = None
         
         for attempt in range(max_retries):
             try:
-                response = await self.client.aio.models.generate_content(
-                    model=self.model,
-                    contents=request_contents,
-                    config=generation_config,
-                )
+                async with self._request_slots:
+                    response = await self.client.aio.models.generate_content(
+                        model=self.model,
+                        contents=request_contents,
+                        config=generation_config,
+                    )
                 logger.info("Content generated successfully via Gemini API.")
                 return response.text
                 
@@ -101,10 +125,74 @@ class GeminiService:
         logger.error(f"Gemini API request failed after {max_retries} attempts. Last error: {last_exception}")
         raise RuntimeError(f"Gemini API failed after {max_retries} retries: {last_exception}")
     
+    async def generate_content_stream(
+        self,
+        prompt: str,
+        images: Optional[List[types.Part]] = None,
+        temperature: float = 0.7,
+        max_output_tokens: int = 8192,
+        max_retries: int = 3,
+    ) -> AsyncIterator[str]:
+        """
+        Generate content asynchronously, yielding text chunks as the model produces them.
+        
+        Failures before the first chunk is yielded are retried with exponential backoff
+        like generate_content; once text has been yielded, a failure is raised rather
+        than retried, since the caller has already consumed part of the response.
+        
+        Args:
+            prompt (str): The text instruction for the model.
+            images (Optional[List[types.Part]]): Optional inline image parts to include in the context.
+            temperature (float): Controls randomness (0.0 to 1.0). Lower is more deterministic.
+            max_output_tokens (int): Maximum number of tokens allowed in the response.
+            max_retries (int): Maximum number of attempts to open the stream.
+            
+        Yields:
+            str: Successive pieces of the generated text.
+            
+        Raises:
+            RuntimeError: If the stream cannot be opened or fails mid-response.
+        """
+        request_contents = [*(images or []), prompt]
+        generation_config = _generation_config(temperature, max_output_tokens)
+        
+        for attempt in range(max_retries):
+            # A slot is held per attempt (through the whole stream once it opens), never across a backoff sleep
+            async with self._request_slots:
+                yielded = False
+                try:
+                    stream = await self.client.aio.models.generate_content_stream(
+                        model=self.model,
+                        contents=request_contents,
+                        config=generation_config,
+                    )
+                    # The SDK stream is lazy: request errors surface on the first iteration step
+                    async for chunk in stream:
+                        if chunk.text:
+                            yielded = True
+                            yield chunk.text
+                except Exception as e:
+                    if yielded:
+                        logger.error(f"Gemini API stream interrupted: {e}")
+                        raise RuntimeError(f"Gemini API stream error: {e}")
+                    open_error = e
+                else:
+                    logger.info("Content streamed successfully via Gemini API.")
+                    return
+            
+            backoff_time = (2 ** attempt)
+            logger.warning(
+                f"Gemini API stream attempt {attempt + 1}/{max_retries} failed: {open_error}. "
+                f"Retrying in {backoff_time}s..."
+            )
+            if attempt == max_retries - 1:
+                raise RuntimeError(f"Gemini API failed after {max_retries} retries: {open_error}")
+            await asyncio.sleep(backoff_time)
+    
     def generate_content_sync(
         self,
         prompt: str,
-        images: Optional[List[Image.Image]] = None,
+        images: Optional[List[types.Part]] = None,
         temperature: float = 0.7,
         max_output_tokens: int = 8192,
     ) -> str:
@@ -116,7 +204,7 @@ class GeminiService:
         
         Args:
             prompt (str): The text instruction.
-            images (Optional[List[Image.Image]]): Optional images.
+            images (Optional[List[types.Part]]): Optional image parts.
             temperature (float): Creativity control.
             max_output_tokens (int): Response length limit.
             
@@ -134,10 +222,7 @@ class GeminiService:
             
             request_contents.append(prompt)
             
-            generation_config = types.GenerateContentConfig(
-                temperature=temperature,
-                max_output_tokens=max_output_tokens,
-            )
+            generation_config = _generation_config(temperature, max_output_tokens)
             
             response = self.client.models.generate_content(
                 model=self.model,
@@ -152,6 +237,16 @@ class GeminiService:
             logger.error(f"Gemini API Sync Error: {e}")
             raise RuntimeError(f"Gemini API error: {e}")
     
+    async def aclose(self):
+        """
+        Close both the async and sync client connection pools.
+        """
+        try:
+            await self.client.aio.aclose()
+        except Exception as e:
+            logger.warning(f"Error while closing async Gemini client: {e}")
+        self.close()
+    
     def close(self):
         """
         Close the Gemini client connection and release resources.
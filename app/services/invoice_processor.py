@@ -6,14 +6,15 @@ It supports both synchronous and asynchronous processing, with parallel executio
 """
 
 import asyncio
-import json
 from typing import List, Dict, Any, Optional
 
-from PIL import Image
+import orjson
+from google.genai import types
 
 from app.services.gemini_service import get_gemini_service
 from app.utils.logger import logger
 from app.utils.file_handler import FileHandler
+from app.utils.llm_cache import get_cached_response, put_cached_response, response_cache_key
 
 
 from app.prompts.invoices import INVOICE_EXTRACTION_PROMPT
@@ -44,35 +45,17 @@ class InvoiceProcessor:
         self.file_handler = FileHandler(session_id)
         logger.info(f"InvoiceProcessor initialized for session: {session_id}")
     
-    def load_images(self) -> List[Image.Image]:
+    def load_images(self) -> List[types.Part]:
         """
         Load all valid invoice images from the session's upload directory.
         
         Returns:
-            List[Image.Image]: A list of PIL Image objects ready for processing.
+            List[types.Part]: Inline image parts (raw file bytes) ready for processing.
         """
-        images = []
-        upload_dir = self.file_handler.get_upload_dir()
-        
-        if not upload_dir.exists():
-            logger.warning(f"Upload directory missing: {upload_dir}")
-            return images
-        
-        supported_extensions = {'.jpg', '.jpeg', '.png'}
-        
-        for file_path in upload_dir.iterdir():
-            if file_path.suffix.lower() in supported_extensions:
-                try:
-                    img = Image.open(file_path)
-                    images.append(img)
-                    logger.info(f"Loaded image: {file_path.name}")
-                except Exception as e:
-                    logger.warning(f"Failed to load image '{file_path.name}': {e}")
+        images = self.file_handler.load_upload_images()
         
         if not images:
             logger.warning("No valid images found in session upload directory.")
-        else:
-            logger.info(f"Loaded {len(images)} images for processing.")
         
         return images
     
@@ -85,14 +68,14 @@ class InvoiceProcessor:
         
         Returns:
             List[Dict[str, Any]]: A list of dictionaries, where each dictionary represents 
-            a line item extracted from the invoices.
+            a line item extracted from the invoices, as saved (numeric fields normalized).
             
         Raises:
             FileNotFoundError: If no images are available for processing.
         """
         logger.info(f"Starting async invoice processing for session: {self.session_id}")
         
-        images = self.load_images()
+        images = await asyncio.to_thread(self.load_images)  # File reads stay off the event loop
         if not images:
             raise FileNotFoundError("No invoice images found to process.")
         
@@ -102,7 +85,7 @@ class InvoiceProcessor:
         
         logger.info(f"Processing {len(images)} images in {len(image_chunks)} batches (Chunk size: {chunk_size}).")
         
-        async def _process_batch(batch_images: List[Image.Image]) -> List[Dict[str, Any]]:
+        async def _process_batch(batch_images: List[types.Part]) -> List[Dict[str, Any]]:
             """
             Process a single batch of images via the Gemini API.
             
@@ -113,12 +96,19 @@ class InvoiceProcessor:
                 List of extracted items from this batch.
             """
             try:
-                response = await self.gemini.generate_content(
-                    prompt=self.EXTRACTION_PROMPT,
-                    images=batch_images,
-                    temperature=0.3,  # Low temperature for factual extraction
-                )
-                return self._parse_json_response(response)
+                cache_key = self._cache_key(batch_images)
+                response = get_cached_response(self.file_handler.get_llm_cache_dir(), cache_key)
+                is_cached = response is not None
+                if not is_cached:
+                    response = await self.gemini.generate_content(
+                        prompt=self.EXTRACTION_PROMPT,
+                        images=batch_images,
+                        temperature=0.3,  # Low temperature for factual extraction
+                    )
+                items = self._parse_json_response(response)
+                if not is_cached:
+                    put_cached_response(self.file_handler.get_llm_cache_dir(), cache_key, response)  # Only responses that parsed are stored
+                return items
             except Exception as e:
                 logger.error(f"Batch processing failed: {e}")
                 return []
@@ -138,7 +128,8 @@ class InvoiceProcessor:
         self.file_handler.save_invoice_data(extracted_items)
         
         logger.info(f"Completed processing. Total items extracted: {len(extracted_items)}.")
-        return extracted_items
+        # Return the rows as saved (numbers normalized), matching what GET /invoices/{id} serves
+        return self.file_handler.load_invoice_data()
     
     def process_invoices_sync(self) -> List[Dict[str, Any]]:
         """
@@ -160,17 +151,29 @@ class InvoiceProcessor:
         if not images:
             raise FileNotFoundError("No invoice images found to process.")
             
-        response_text = self.gemini.generate_content_sync(
-            prompt=self.EXTRACTION_PROMPT,
-            images=images,
-            temperature=0.3,
-        )
+        cache_key = self._cache_key(images)
+        response_text = get_cached_response(self.file_handler.get_llm_cache_dir(), cache_key)
+        is_cached = response_text is not None
+        if not is_cached:
+            response_text = self.gemini.generate_content_sync(
+                prompt=self.EXTRACTION_PROMPT,
+                images=images,
+                temperature=0.3,
+            )
         
         extracted_items = self._parse_json_response(response_text)
+        if not is_cached:
+            put_cached_response(self.file_handler.get_llm_cache_dir(), cache_key, response_text)
         self.file_handler.save_invoice_data(extracted_items)
         
         logger.info(f"Completed sync processing. Total items extracted: {len(extracted_items)}.")
-        return extracted_items
+        return self.file_handler.load_invoice_data()
+    
+    def _cache_key(self, images: List[types.Part]) -> str:
+        """Build the response cache key for an extraction request over these images."""
+        return response_cache_key(
+            self.EXTRACTION_PROMPT, [part.inline_data.data for part in images], temperature=0.3
+        )
     
     def _parse_json_response(self, response_text: str) -> List[Dict[str, Any]]:
         """
@@ -208,7 +211,7 @@ class InvoiceProcessor:
             if start_idx != -1 and end_idx != -1:
                 cleaned_text = cleaned_text[start_idx:end_idx + 1]
             
-            data = json.loads(cleaned_text)
+            data = orjson.loads(cleaned_text)
             
             if not isinstance(data, list):
                 raise ValueError("Parsed data is not a list as expected.")
@@ -216,7 +219,7 @@ class InvoiceProcessor:
             logger.debug(f"Successfully parsed {len(data)} items.")
             return data
             
-        except json.JSONDecodeError as e:
+        except orjson.JSONDecodeError as e:
             logger.error(f"JSON Parsing Error: {e}")
             logger.debug(f"Failed Response Content: {response_text[:200]}...")
             raise ValueError(f"Invalid JSON response from AI model: {e}")
@@ -3,11 +3,14 @@ Report Generator Service.
 Generates AI-powered analytics reports from invoice data.
 """
 
-from PIL import Image
+import asyncio
+
+from google.genai import types
 
 from app.services.gemini_service import get_gemini_service
 from app.utils.logger import logger
 from app.utils.file_handler import FileHandler
+from app.utils.llm_cache import get_cached_response, put_cached_response, response_cache_key
 
 
 from app.prompts.analytics import REPORT_GENERATION_PROMPT
@@ -21,6 +24,9 @@ class ReportGenerator:
     # Prompt for generating analytics report
     REPORT_PROMPT = REPORT_GENERATION_PROMPT
     
+    # Generation settings for both the async and sync paths (also part of the cache key)
+    GENERATION_PARAMS = {"temperature": 0.5, "max_output_tokens": 4096}
+    
     def __init__(self, session_id: str):
         """
         Initialize the report generator.
@@ -33,32 +39,14 @@ class ReportGenerator:
         self.file_handler = FileHandler(session_id)
         logger.info(f"Report generator initialized for session: {session_id}")
     
-    def load_images(self) -> list[Image.Image]:
+    def load_images(self) -> list[types.Part]:
         """
         Load all invoice images for this session.
         
         Returns:
-            List of PIL Image objects
+            List of inline image parts (raw file bytes)
         """
-        images = []
-        upload_dir = self.file_handler.get_upload_dir()
-        
-        if not upload_dir.exists():
-            logger.warning(f"Upload directory not found: {upload_dir}")
-            return images
-        
-        supported_extensions = {'.jpg', '.jpeg', '.png'}
-        
-        for file_path in upload_dir.iterdir():
-            if file_path.suffix.lower() in supported_extensions:
-                try:
-                    img = Image.open(file_path)
-                    images.append(img)
-                    logger.info(f"Loaded image for report: {file_path.name}")
-                except Exception as e:
-                    logger.warning(f"Failed to load image {file_path.name}: {e}")
-        
-        return images
+        return self.file_handler.load_upload_images()
     
     def load_csv_data(self) -> str | None:
         """
@@ -82,77 +70,104 @@ class ReportGenerator:
         
         return None
 
-    async def generate_report(self) -> str:
+    def _prepare_request(self) -> tuple[str, list[types.Part]]:
+        """
+        Build the report prompt and image parts, shared by the async and sync paths.
+        
+        Uses the invoice images when present, otherwise falls back to an uploaded CSV.
+        
+        Returns:
+            Tuple of (prompt, image parts); parts are empty for the CSV fallback
+            
+        Raises:
+            FileNotFoundError: If neither images nor CSV data are available
+        """
+        # 1. Try Loading Images
+        images = self.load_images()
+        if images:
+            logger.info(f"Generating report from {len(images)} invoice images")
+            return self.REPORT_PROMPT, images
+        
+        # 2. Try Loading CSV
+        csv_data = self.load_csv_data()
+        if not csv_data:
+            raise FileNotFoundError("No invoice images or CSV data found for report generation")
+        
+        logger.info("Generating report from CSV data")
+        # Append CSV data to prompt
+        prompt = (
+            f"{self.REPORT_PROMPT}\n\n"
+            f"## Invoice Data (CSV)\n"
+            f"Please base your analysis on the following structured data instead of images:\n\n"
+            f"```csv\n{csv_data[:100000]}  # Truncate to avoid context limits if huge\n```"
+        )
+        return prompt, []
+
+    async def generate_report(self, regenerate: bool = False) -> str:
         """
         Generate an analytics report from invoice images or CSV data.
         
+        Args:
+            regenerate: Skip the stored response and ask the model for a fresh report
+        
         Returns:
             Generated report text in markdown format
         """
         logger.info(f"Starting report generation for session: {self.session_id}")
         
-        # 1. Try Loading Images
-        images = self.load_images()
+        # File reads stay off the event loop
+        prompt, images = await asyncio.to_thread(self._prepare_request)
         
-        if images:
-            logger.info(f"Generating report from {len(images)} invoice images")
-            report_text = await self.gemini.generate_content(
-                prompt=self.REPORT_PROMPT,
-                images=images,
-                temperature=0.5,
-                max_output_tokens=4096,
-            )
-        else:
-            # 2. Try Loading CSV
-            csv_data = self.load_csv_data()
-            if csv_data:
-                logger.info("Generating report from CSV data")
-                # Append CSV data to prompt
-                prompt = (
-                    f"{self.REPORT_PROMPT}\n\n"
-                    f"## Invoice Data (CSV)\n"
-                    f"Please base your analysis on the following structured data instead of images:\n\n"
-                    f"```csv\n{csv_data[:100000]}  # Truncate to avoid context limits if huge\n```"
-                )
-                
-                report_text = await self.gemini.generate_content(
+        cache_key = self._cache_key(prompt, images)
+        cache_dir = self.file_handler.get_llm_cache_dir()
+        report_text = None if regenerate else get_cached_response(cache_dir, cache_key)
+        if report_text is None:
+            # Stream straight to the report file so disk writes overlap generation
+            report_text = await self.file_handler.save_report_stream(
+                self.gemini.generate_content_stream(
                     prompt=prompt,
-                    images=None,
-                    temperature=0.5,
-                    max_output_tokens=4096,
+                    images=images or None,
+                    **self.GENERATION_PARAMS,
                 )
-            else:
-                raise FileNotFoundError("No invoice images or CSV data found for report generation")
-        
-        # Save report
-        self.file_handler.save_report(report_text)
+            )
+            put_cached_response(cache_dir, cache_key, report_text)
+        else:
+            self.file_handler.save_report(report_text)
         
         logger.info("Successfully generated analytics report")
         return report_text
     
-    def generate_report_sync(self) -> str:
+    def generate_report_sync(self, regenerate: bool = False) -> str:
         """
         Synchronous version of generate_report.
         """
         logger.info(f"Starting report generation (sync) for session: {self.session_id}")
         
-        images = self.load_images()
-        
-        if not images:
-            raise FileNotFoundError("No invoice images found for report generation")
+        prompt, images = self._prepare_request()
         
-        report_text = self.gemini.generate_content_sync(
-            prompt=self.REPORT_PROMPT,
-            images=images,
-            temperature=0.5,
-            max_output_tokens=4096,
-        )
+        cache_key = self._cache_key(prompt, images)
+        cache_dir = self.file_handler.get_llm_cache_dir()
+        report_text = None if regenerate else get_cached_response(cache_dir, cache_key)
+        if report_text is None:
+            report_text = self.gemini.generate_content_sync(
+                prompt=prompt,
+                images=images or None,
+                **self.GENERATION_PARAMS,
+            )
+            put_cached_response(cache_dir, cache_key, report_text)
         
         self.file_handler.save_report(report_text)
         
         logger.info("Successfully generated analytics report")
         return report_text
     
+    @classmethod
+    def _cache_key(cls, prompt: str, images: list[types.Part]) -> str:
+        """Build the response cache key for a report request."""
+        return response_cache_key(
+            prompt, [part.inline_data.data for part in images], **cls.GENERATION_PARAMS
+        )
+    
     def get_saved_report(self) -> str:
         """
         Get previously generated report.
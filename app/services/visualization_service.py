@@ -4,11 +4,253 @@ Generates chart data from processed invoice data.
 Returns JSON-serializable data for frontend rendering.
 """
 
-from typing import Any, Optional
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+from typing import Any, Callable, Optional
+import numpy as np
 import pandas as pd
+from plotly.colors import sample_colorscale
 
 from app.utils.logger import logger
-from app.utils.file_handler import FileHandler
+from app.utils.file_handler import FileHandler, read_csv_cached
+
+
+# Shared pool for building chart payloads concurrently (pandas releases the GIL in its C kernels)
+_chart_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="viz")
+
+# Generated chart payloads keyed by (session, data version, selected columns)
+_CHART_CACHE: dict[tuple, list[dict[str, Any]]] = {}
+_CHART_CACHE_SIZE = 32
+
+# Line charts with more points than this are downsampled before being sent to the browser
+MAX_LINE_POINTS = 2000
+
+# Bar charts keep at most this many categories; product bars fold the rest into one "Others" bar
+MAX_BAR_CATEGORIES = 50
+OTHERS_BAR_COLOR = "#B0B0B0"
+
+
+def clear_chart_cache(session_id: Optional[str] = None):
+    """
+    Drop cached chart payloads (e.g. after sessions are deleted).
+    
+    Args:
+        session_id: Only drop this session's payloads; all payloads when None
+    """
+    if session_id is None:
+        _CHART_CACHE.clear()
+        return
+    for key in [key for key in _CHART_CACHE if key[0] == session_id]:
+        del _CHART_CACHE[key]
+
+
+def _safe_chart(label: str) -> Callable:
+    """
+    Decorate a chart builder so a failure is logged and skipped instead of raised.
+    
+    Args:
+        label: Chart description used in the error log
+    
+    Returns:
+        Decorator returning the builder's payload, or None if it raised
+    """
+    def decorator(builder: Callable[..., dict[str, Any]]) -> Callable[..., Optional[dict[str, Any]]]:
+        @wraps(builder)
+        def wrapper(*args, **kwargs) -> Optional[dict[str, Any]]:
+            try:
+                return builder(*args, **kwargs)
+            except Exception as e:
+                logger.error(f"Error creating {label}: {e}")
+                return None
+        return wrapper
+    return decorator
+
+
+def _lttb_indices(y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Pick n_out point indices with Largest-Triangle-Three-Buckets downsampling.
+    
+    Points are treated as evenly spaced on x. The first and last points are always
+    kept; from each bucket in between, the point forming the largest triangle with the
+    previously kept point and the next bucket's average is chosen, preserving peaks.
+    """
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    
+    y = y.astype(np.float64)
+    bucket_size = (n - 2) / (n_out - 2)
+    indices = np.empty(n_out, dtype=np.int64)
+    indices[0], indices[-1] = 0, n - 1
+    
+    prev = 0
+    for i in range(n_out - 2):
+        start = int(i * bucket_size) + 1
+        end = int((i + 1) * bucket_size) + 1
+        next_end = min(int((i + 2) * bucket_size) + 1, n)
+        avg_x = (end + next_end - 1) / 2
+        avg_y = y[end:next_end].mean()
+        
+        xs = np.arange(start, end)
+        area = np.abs((prev - avg_x) * (y[start:end] - y[prev]) - (prev - xs) * (avg_y - y[prev]))
+        prev = start + int(np.argmax(area))
+        indices[i + 1] = prev
+    return indices
+
+
+def _downsample_line(series: pd.Series) -> pd.Series:
+    """Downsample a line chart series to at most MAX_LINE_POINTS points."""
+    if len(series) <= MAX_LINE_POINTS:
+        return series
+    return series.iloc[_lttb_indices(series.to_numpy(dtype=np.float64), MAX_LINE_POINTS)]
+
+
+def _top_with_others(totals: pd.Series, colorscale: str, n: int = MAX_BAR_CATEGORIES) -> tuple[pd.Series, list[str]]:
+    """
+    Rank totals ascending for a horizontal bar chart and colour them along a colorscale.
+    
+    Only the n largest totals are kept. The rest are summed into an "Others" bar pinned
+    at the bottom in a neutral colour, outside the ranking and the colour scale, so the
+    aggregate cannot dominate either.
+    
+    Returns:
+        The bar totals in plotting order and one marker colour per bar
+    """
+    top = totals.sort_values(ascending=True).iloc[-n:]
+    if top.empty:
+        return top, []
+    values = top.to_numpy(dtype=np.float64)
+    span = np.ptp(values)
+    scaled = (values - values.min()) / span if span else np.zeros(len(values))
+    colors = sample_colorscale(colorscale, scaled.tolist())
+    
+    hidden = len(totals) - len(top)
+    if hidden:
+        others = pd.Series([totals.drop(top.index).sum()], index=[f"Others ({hidden} products)"], name=totals.name)
+        top = pd.concat([others, top])
+        colors = [OTHERS_BAR_COLOR, *colors]
+    return top, colors
+
+
+def _key_codes(keys: pd.Series, sort: bool) -> Optional[tuple[np.ndarray, pd.Index]]:
+    """
+    Integer group codes (-1 for missing) and their labels for categorical or string keys.
+    
+    Returns None for other key types, which are left to pandas.
+    """
+    if isinstance(keys.dtype, pd.CategoricalDtype):
+        return keys.cat.codes.to_numpy(), keys.cat.categories
+    if keys.dtype == object or pd.api.types.is_string_dtype(keys.dtype):
+        try:
+            codes, uniques = pd.factorize(keys, sort=sort)
+        except TypeError:
+            return None  # Mixed key types cannot be ordered
+        return codes, pd.Index(uniques)
+    return None
+
+
+def _sum_by_codes(codes: np.ndarray, labels: pd.Index, values: pd.DataFrame, name: Any) -> pd.DataFrame:
+    """Sum value columns per observed code with np.bincount, in label order."""
+    mask = codes >= 0
+    codes = codes[mask]
+    n_groups = len(labels)
+    observed = np.bincount(codes, minlength=n_groups) > 0
+    
+    sums = {}
+    for col in values.columns:
+        val_arr = values[col].to_numpy()[mask]
+        if val_arr.dtype.kind == 'f':
+            val_arr = np.nan_to_num(val_arr)  # groupby().sum() skips NaN
+        col_sums = np.bincount(codes, weights=val_arr, minlength=n_groups)[observed]
+        if val_arr.dtype.kind in 'iu':
+            col_sums = col_sums.astype(np.int64)  # bincount weights are float64; integer sums are exact below 2**53
+        sums[col] = col_sums
+    return pd.DataFrame(sums, index=pd.Index(labels[observed], name=name))
+
+
+def _group_sums(keys: pd.Series, values: pd.DataFrame, sort: bool = True) -> pd.DataFrame:
+    """
+    Sum several value columns per key, equivalent to values.groupby(keys, observed=True).sum().
+    
+    Categorical keys are summed straight from their integer codes with np.bincount;
+    string keys are first factorized to codes (a C hash pass), and all columns share
+    the same codes. Other key types (dates, numbers) fall back to pandas.
+    
+    Args:
+        keys: Group keys
+        values: Value columns to sum
+        sort: Whether keys must come back in sorted order. Pass False when the caller
+            re-orders the result anyway.
+    
+    Returns:
+        Sums indexed by key, one column per value column
+    """
+    is_plain_numeric = all(isinstance(dtype, np.dtype) and dtype.kind in 'iuf' for dtype in values.dtypes)
+    key_codes = _key_codes(keys, sort) if is_plain_numeric else None
+    if key_codes is None:
+        return values.groupby(keys, observed=True, sort=sort).sum()
+    return _sum_by_codes(*key_codes, values, keys.name)
+
+
+def _group_sum(keys: pd.Series, values: pd.Series, sort: bool = True) -> pd.Series:
+    """Sum values per key, equivalent to values.groupby(keys, observed=True).sum() (see _group_sums)."""
+    return _group_sums(keys, values.to_frame(), sort=sort).iloc[:, 0].rename(values.name)
+
+
+def _date_buckets(dates: pd.Series, unit: str) -> np.ndarray:
+    """Truncate timestamps to datetime64[unit] calendar buckets ('D' for days, 'M' for months)."""
+    if dates.dt.tz is not None:
+        dates = dates.dt.tz_localize(None)  # bucket by local wall-clock time, like .dt.date
+    return dates.to_numpy().astype(f'datetime64[{unit}]')
+
+
+def _bucket_sum(buckets: np.ndarray, values: pd.Series) -> pd.Series:
+    """
+    Sum values per date bucket, in date order, skipping NaT buckets.
+    
+    Buckets are integer offsets from the epoch, so the sums come from one np.bincount
+    over the offset range instead of a groupby on per-row date or string objects. Only
+    the distinct buckets are formatted as labels ('YYYY-MM-DD' for days, 'YYYY-MM' for
+    months).
+    """
+    mask = ~np.isnat(buckets)
+    val_arr = values.to_numpy()
+    if val_arr.dtype.kind not in 'iuf' or not mask.any():
+        sums = values.groupby(buckets).sum()
+        sums.index = np.datetime_as_string(sums.index.to_numpy().astype(buckets.dtype))
+        return sums
+    
+    offsets = buckets[mask].view(np.int64)
+    val_arr = val_arr[mask]
+    if val_arr.dtype.kind == 'f':
+        val_arr = np.nan_to_num(val_arr)  # groupby().sum() skips NaN
+    
+    first = offsets.min()
+    offsets = offsets - first
+    observed = np.bincount(offsets) > 0
+    sums = np.bincount(offsets, weights=val_arr)[observed]
+    if val_arr.dtype.kind in 'iu':
+        sums = sums.astype(np.int64)  # bincount weights are float64; integer sums are exact below 2**53
+    labels = np.datetime_as_string((np.flatnonzero(observed) + first).astype(buckets.dtype))
+    return pd.Series(sums, index=labels, name=values.name)
+
+
+def _group_nunique(keys: pd.Series, values: pd.Series) -> pd.Series:
+    """
+    Count distinct values per key, equivalent to values.groupby(keys).nunique().
+    
+    Both columns are factorized to integer codes; each distinct (key, value) pair then
+    becomes one integer, so the count is an np.unique plus np.bincount instead of a
+    per-group set construction.
+    """
+    key_codes, key_uniques = pd.factorize(keys, sort=True)
+    value_codes, value_uniques = pd.factorize(values)
+    n_values = max(len(value_uniques), 1)
+    
+    mask = (key_codes >= 0) & (value_codes >= 0)  # NaN keys and values are not counted
+    pairs = np.unique(key_codes[mask].astype(np.int64) * n_values + value_codes[mask])
+    counts = np.bincount(pairs // n_values, minlength=len(key_uniques))
+    return pd.Series(counts, index=pd.Index(key_uniques, name=keys.name), name=values.name)
 
 
 class VisualizationService:
@@ -38,30 +280,43 @@ class VisualizationService:
             if upload_dir.exists():
                 for file in upload_dir.glob("*.csv"):
                     try:
-                        self._df = pd.read_csv(file)
+                        self._df = read_csv_cached(file)
                         logger.info(f"Loaded CSV from uploads: {file.name}")
                         return self._df
                     except Exception as e:
                         logger.warning(f"Failed to load CSV {file.name}: {e}")
             
             # Priority 2: Load processed invoice data (invoice image mode)
-            data = self.file_handler.load_invoice_data()
-            if not data:
+            df = self.file_handler.load_invoice_frame()
+            if df is None or df.empty:
                 raise FileNotFoundError("No data found. Please upload invoices or CSV first.")
-            self._df = pd.DataFrame(data)
+            self._df = df
             logger.info("Loaded processed invoice data")
         return self._df
     
+    def _uses_invoice_data(self) -> bool:
+        """Check whether data comes from processed invoices (no uploaded CSV in the session)."""
+        upload_dir = self.file_handler.get_upload_dir()
+        return not (upload_dir.exists() and any(upload_dir.glob("*.csv")))
+    
     def get_available_columns(self) -> list[str]:
         """Get list of available columns in the data."""
+        if self._df is None and self._uses_invoice_data():
+            # Read column names from the Parquet schema instead of loading the data
+            columns = self.file_handler.get_invoice_columns()
+            if not columns:
+                raise FileNotFoundError("No data found. Please upload invoices or CSV first.")
+            return columns
         return self.df.columns.tolist()
     
-    def _find_column(self, possible_names: list[str]) -> Optional[str]:
+    def _find_column(self, possible_names: list[str], columns: list[str]) -> Optional[str]:
         """Find a column matching any of the possible names."""
+        lowered = [(col, col.lower()) for col in columns]  # Lower each column name once
         for name in possible_names:
-            matches = [col for col in self.df.columns if name.lower() in col.lower()]
-            if matches:
-                return matches[0]
+            name = name.lower()
+            match = next((col for col, col_lower in lowered if name in col_lower), None)
+            if match is not None:
+                return match
         return None
     
     def generate_visualizations(self, selected_columns: list[str]) -> list[dict[str, Any]]:
@@ -74,17 +329,30 @@ class VisualizationService:
         Returns:
             List of chart data dictionaries
         """
+        cache_key = (self.session_id, self.file_handler.get_data_version(), tuple(selected_columns))
+        cached = _CHART_CACHE.get(cache_key)
+        if cached is not None:
+            logger.info(f"Using cached visualizations for columns: {selected_columns}")
+            return cached
+        
         logger.info(f"Generating visualizations for columns: {selected_columns}")
         
-        charts = []
-        df_selected = self.df[selected_columns]
+        columns = self.get_available_columns()
+        if self._df is None and self._uses_invoice_data():
+            # Projected read: only the selected columns are decoded
+            df_selected = self.file_handler.load_invoice_frame(selected_columns)
+        else:
+            df_selected = self.df.loc[:, list(selected_columns)]
+        # A shallow copy owns its column slots: the columns replaced below never write into
+        # the cached frame, and no frame-wide copy is made per replaced column
+        df_selected = df_selected.copy(deep=False)
         
         # Identify column types
-        date_col = self._find_column(['date', 'invoice date', 'bill date'])
-        product_col = self._find_column(['product', 'item', 'description', 'product name'])
-        amount_col = self._find_column(['amount', 'total', 'value'])
-        quantity_col = self._find_column(['qty', 'quantity', 'units'])
-        invoice_col = self._find_column(['invoice', 'invoice number', 'invoice no', 'bill number'])
+        date_col = self._find_column(['date', 'invoice date', 'bill date'], columns)
+        product_col = self._find_column(['product', 'item', 'description', 'product name'], columns)
+        amount_col = self._find_column(['amount', 'total', 'value'], columns)
+        quantity_col = self._find_column(['qty', 'quantity', 'units'], columns)
+        invoice_col = self._find_column(['invoice', 'invoice number', 'invoice no', 'bill number'], columns)
         
         # Filter to only selected columns
         date_col = date_col if date_col in selected_columns else None
@@ -93,334 +361,337 @@ class VisualizationService:
         quantity_col = quantity_col if quantity_col in selected_columns else None
         invoice_col = invoice_col if invoice_col in selected_columns else None
         
-        # Generate charts based on available columns
+        if df_selected.empty:
+            logger.info("No rows to visualize")
+            return []
+        
+        # All-missing value columns would only produce empty charts
+        if amount_col and not df_selected[amount_col].notna().any():
+            amount_col = None
+        if quantity_col and not df_selected[quantity_col].notna().any():
+            quantity_col = None
+        
+        if date_col:
+            # Parse dates once for all date-based charts
+            try:
+                df_selected[date_col] = pd.to_datetime(df_selected[date_col], format='mixed', dayfirst=True)
+            except Exception as e:
+                logger.error(f"Error parsing date column '{date_col}': {e}")
+                date_col = None
+        
+        # Group keys as categoricals: every product/invoice aggregation then runs on integer codes
+        for key_col in (product_col, invoice_col):
+            if key_col and not isinstance(df_selected[key_col].dtype, pd.CategoricalDtype):
+                df_selected[key_col] = df_selected[key_col].astype('category')
+        
+        # Collect chart builders based on available columns
+        tasks = []
         if amount_col:
-            charts.append(self._amount_boxplot(df_selected, amount_col))
+            tasks.append((self._amount_boxplot, amount_col))
         
         if quantity_col:
-            charts.append(self._quantity_boxplot(df_selected, quantity_col))
+            tasks.append((self._quantity_boxplot, quantity_col))
         
-        if product_col and amount_col:
-            charts.append(self._product_sales_bar(df_selected, product_col, amount_col))
-            charts.append(self._top_products_pareto(df_selected, product_col, amount_col))
+        value_cols = [col for col in dict.fromkeys((amount_col, quantity_col)) if col]
+        if product_col and value_cols:
+            # Revenue and quantity per product in one aggregation, shared by the product charts
+            try:
+                # Every product chart sorts by value, so key order does not matter here
+                product_totals = _group_sums(df_selected[product_col], df_selected[value_cols], sort=False)
+                if amount_col:
+                    tasks.append((self._product_sales_bar, product_col, product_totals[amount_col]))
+                    tasks.append((self._top_products_pareto, product_totals[amount_col]))
+                if quantity_col:
+                    tasks.append((self._quantity_by_product, product_col, product_totals[quantity_col]))
+            except Exception as e:
+                logger.error(f"Error aggregating totals by product: {e}")
         
-        if product_col and quantity_col:
-            charts.append(self._quantity_by_product(df_selected, product_col, quantity_col))
+        # Calendar-day buckets shared by the daily charts
+        days = _date_buckets(df_selected[date_col], 'D') if date_col else None
+        has_day_range = False
+        if days is not None:
+            valid_days = days[~np.isnat(days)]
+            if valid_days.size == 0:
+                date_col = None
+            else:
+                # A daily line needs at least two distinct days
+                has_day_range = valid_days.min() != valid_days.max()
         
         if date_col and amount_col:
-            charts.append(self._daily_sales_line(df_selected, date_col, amount_col))
-            charts.append(self._monthly_revenue(df_selected, date_col, amount_col))
-            charts.append(self._weekday_analysis(df_selected, date_col, amount_col))
+            if has_day_range:
+                tasks.append((self._daily_sales_line, days, amount_col))
+            tasks.append((self._monthly_revenue, date_col, amount_col))
+            tasks.append((self._weekday_analysis, date_col, amount_col))
         
-        if invoice_col and date_col:
-            charts.append(self._invoice_trends(df_selected, invoice_col, date_col))
+        if invoice_col and has_day_range:
+            tasks.append((self._invoice_trends, invoice_col, days))
         
         if invoice_col and product_col:
-            charts.append(self._products_per_invoice(df_selected, invoice_col, product_col))
+            tasks.append((self._products_per_invoice, invoice_col, product_col))
+        
+        # Build charts concurrently; map() keeps the original chart order
+        charts = list(_chart_executor.map(lambda task: task[0](df_selected, *task[1:]), tasks))
         
         # Filter out None values
         charts = [c for c in charts if c is not None]
         
+        if len(_CHART_CACHE) >= _CHART_CACHE_SIZE:
+            _CHART_CACHE.pop(next(iter(_CHART_CACHE)))  # Evict the oldest entry
+        _CHART_CACHE[cache_key] = charts
+        
         logger.info(f"Generated {len(charts)} charts")
         return charts
     
+    @_safe_chart("amount boxplot")
     def _amount_boxplot(self, df: pd.DataFrame, amount_col: str) -> dict[str, Any]:
         """Generate amount distribution boxplot data."""
-        try:
-            return {
-                "chart_type": "box",
-                "chart_name": "Amount Distribution",
-                "data": {
-                    "y": df[amount_col].tolist(),
-                    "type": "box",
-                    "name": "Amount",
-                    "marker": {"color": "#636EFA"}
-                },
-                "layout": {
-                    "title": "Amount Distribution",
-                    "yaxis": {"title": amount_col},
-                    "template": "plotly_white"
-                }
+        return {
+            "chart_type": "box",
+            "chart_name": "Amount Distribution",
+            "data": {
+                "y": df[amount_col].tolist(),
+                "type": "box",
+                "name": "Amount",
+                "marker": {"color": "#636EFA"}
+            },
+            "layout": {
+                "title": "Amount Distribution",
+                "yaxis": {"title": amount_col},
+                "template": "plotly_white"
             }
-        except Exception as e:
-            logger.error(f"Error creating amount boxplot: {e}")
-            return None
+        }
     
+    @_safe_chart("quantity boxplot")
     def _quantity_boxplot(self, df: pd.DataFrame, quantity_col: str) -> dict[str, Any]:
         """Generate quantity distribution boxplot data."""
-        try:
-            return {
-                "chart_type": "box",
-                "chart_name": "Quantity Distribution",
-                "data": {
-                    "x": df[quantity_col].tolist(),
-                    "type": "box",
-                    "name": "Quantity",
-                    "marker": {"color": "#FF6347"}
-                },
-                "layout": {
-                    "title": "Quantity Distribution",
-                    "xaxis": {"title": quantity_col},
-                    "template": "plotly_white"
-                }
-            }
-        except Exception as e:
-            logger.error(f"Error creating quantity boxplot: {e}")
-            return None
-    
-    def _product_sales_bar(self, df: pd.DataFrame, product_col: str, amount_col: str) -> dict[str, Any]:
-        """Generate sales by product bar chart data."""
-        try:
-            product_sales = df.groupby(product_col)[amount_col].sum().reset_index()
-            product_sales = product_sales.sort_values(by=amount_col, ascending=True)
-            
-            return {
-                "chart_type": "bar",
-                "chart_name": "Sales by Product",
-                "data": {
-                    "x": product_sales[amount_col].tolist(),
-                    "y": product_sales[product_col].tolist(),
-                    "type": "bar",
-                    "orientation": "h",
-                    "marker": {
-                        "color": product_sales[amount_col].tolist(),
-                        "colorscale": "Viridis"
-                    }
-                },
-                "layout": {
-                    "title": "Sales by Product",
-                    "xaxis": {"title": "Total Sales Amount"},
-                    "yaxis": {"title": product_col, "automargin": True},
-                    "template": "plotly_white",
-                    "margin": {"l": 150, "r": 20, "t": 40, "b": 50},
-                    "height": max(400, len(product_sales) * 30)
-                }
+        return {
+            "chart_type": "box",
+            "chart_name": "Quantity Distribution",
+            "data": {
+                "x": df[quantity_col].tolist(),
+                "type": "box",
+                "name": "Quantity",
+                "marker": {"color": "#FF6347"}
+            },
+            "layout": {
+                "title": "Quantity Distribution",
+                "xaxis": {"title": quantity_col},
+                "template": "plotly_white"
             }
-        except Exception as e:
-            logger.error(f"Error creating product sales bar: {e}")
-            return None
+        }
     
-    def _top_products_pareto(self, df: pd.DataFrame, product_col: str, amount_col: str) -> dict[str, Any]:
-        """Generate top products pareto chart data."""
-        try:
-            product_sales = df.groupby(product_col)[amount_col].sum().sort_values(ascending=False).reset_index()
-            top_10 = product_sales.head(10)
-            cumulative_pct = (top_10[amount_col].cumsum() / product_sales[amount_col].sum() * 100).tolist()
-            
-            return {
-                "chart_type": "bar+line",
-                "chart_name": "Top 10 Products (Pareto)",
-                "data": [
-                    {
-                        "x": top_10[product_col].tolist(),
-                        "y": top_10[amount_col].tolist(),
-                        "type": "bar",
-                        "name": "Revenue",
-                        "marker": {"color": "#636EFA"}
-                    },
-                    {
-                        "x": top_10[product_col].tolist(),
-                        "y": cumulative_pct,
-                        "type": "scatter",
-                        "mode": "lines+markers",
-                        "name": "Cumulative %",
-                        "yaxis": "y2",
-                        "marker": {"color": "#EF553B"}
-                    }
-                ],
-                "layout": {
-                    "title": "Top 10 Products by Revenue (Pareto)",
-                    "xaxis": {"title": "Product"},
-                    "yaxis": {"title": "Revenue"},
-                    "yaxis2": {
-                        "title": "Cumulative %",
-                        "overlaying": "y",
-                        "side": "right",
-                        "range": [0, 100]
-                    },
-                    "template": "plotly_white"
-                }
+    @_safe_chart("product sales bar")
+    def _product_sales_bar(self, df: pd.DataFrame, product_col: str, product_sales: pd.Series) -> dict[str, Any]:
+        """Generate sales by product bar chart data from per-product revenue totals."""
+        product_sales, colors = _top_with_others(product_sales, "Viridis")
+        
+        return {
+            "chart_type": "bar",
+            "chart_name": "Sales by Product",
+            "data": {
+                "x": product_sales.values.tolist(),
+                "y": product_sales.index.tolist(),
+                "type": "bar",
+                "orientation": "h",
+                "marker": {"color": colors}
+            },
+            "layout": {
+                "title": "Sales by Product",
+                "xaxis": {"title": "Total Sales Amount"},
+                "yaxis": {"title": product_col, "automargin": True},
+                "template": "plotly_white",
+                "margin": {"l": 150, "r": 20, "t": 40, "b": 50},
+                "height": max(400, len(product_sales) * 30)
             }
-        except Exception as e:
-            logger.error(f"Error creating pareto chart: {e}")
-            return None
+        }
     
-    def _quantity_by_product(self, df: pd.DataFrame, product_col: str, quantity_col: str) -> dict[str, Any]:
-        """Generate quantity by product bar chart data."""
-        try:
-            qty_by_product = df.groupby(product_col)[quantity_col].sum().reset_index()
-            qty_by_product = qty_by_product.sort_values(by=quantity_col, ascending=True)
-            
-            return {
-                "chart_type": "bar",
-                "chart_name": "Quantity by Product",
-                "data": {
-                    "x": qty_by_product[quantity_col].tolist(),
-                    "y": qty_by_product[product_col].tolist(),
+    @_safe_chart("pareto chart")
+    def _top_products_pareto(self, df: pd.DataFrame, product_sales: pd.Series) -> dict[str, Any]:
+        """Generate top products pareto chart data from per-product revenue totals."""
+        product_sales = product_sales.sort_values(ascending=False)
+        top_10 = product_sales.head(10)
+        cumulative_pct = (top_10.cumsum() / product_sales.sum() * 100).tolist()
+        
+        return {
+            "chart_type": "bar+line",
+            "chart_name": "Top 10 Products (Pareto)",
+            "data": [
+                {
+                    "x": top_10.index.tolist(),
+                    "y": top_10.values.tolist(),
                     "type": "bar",
-                    "orientation": "h",
-                    "marker": {
-                        "color": qty_by_product[quantity_col].tolist(),
-                        "colorscale": "Cividis"
-                    }
+                    "name": "Revenue",
+                    "marker": {"color": "#636EFA"}
                 },
-                "layout": {
-                    "title": "Quantity Sold by Product",
-                    "xaxis": {"title": "Total Quantity"},
-                    "yaxis": {"title": product_col, "automargin": True},
-                    "template": "plotly_white",
-                    "margin": {"l": 150, "r": 20, "t": 40, "b": 50},
-                    "height": max(400, len(qty_by_product) * 30)
+                {
+                    "x": top_10.index.tolist(),
+                    "y": cumulative_pct,
+                    "type": "scatter",
+                    "mode": "lines+markers",
+                    "name": "Cumulative %",
+                    "yaxis": "y2",
+                    "marker": {"color": "#EF553B"}
                 }
+            ],
+            "layout": {
+                "title": "Top 10 Products by Revenue (Pareto)",
+                "xaxis": {"title": "Product"},
+                "yaxis": {"title": "Revenue"},
+                "yaxis2": {
+                    "title": "Cumulative %",
+                    "overlaying": "y",
+                    "side": "right",
+                    "range": [0, 100]
+                },
+                "template": "plotly_white"
+            }
+        }
+    
+    @_safe_chart("quantity by product")
+    def _quantity_by_product(self, df: pd.DataFrame, product_col: str, qty_by_product: pd.Series) -> dict[str, Any]:
+        """Generate quantity by product bar chart data from per-product quantity totals."""
+        qty_by_product, colors = _top_with_others(qty_by_product, "Cividis")
+        
+        return {
+            "chart_type": "bar",
+            "chart_name": "Quantity by Product",
+            "data": {
+                "x": qty_by_product.values.tolist(),
+                "y": qty_by_product.index.tolist(),
+                "type": "bar",
+                "orientation": "h",
+                "marker": {"color": colors}
+            },
+            "layout": {
+                "title": "Quantity Sold by Product",
+                "xaxis": {"title": "Total Quantity"},
+                "yaxis": {"title": product_col, "automargin": True},
+                "template": "plotly_white",
+                "margin": {"l": 150, "r": 20, "t": 40, "b": 50},
+                "height": max(400, len(qty_by_product) * 30)
             }
-        except Exception as e:
-            logger.error(f"Error creating quantity by product: {e}")
-            return None
+        }
     
-    def _daily_sales_line(self, df: pd.DataFrame, date_col: str, amount_col: str) -> dict[str, Any]:
+    @_safe_chart("daily sales line")
+    def _daily_sales_line(self, df: pd.DataFrame, days: np.ndarray, amount_col: str) -> dict[str, Any]:
         """Generate daily sales line chart data."""
-        try:
-            df_copy = df.copy()
-            df_copy[date_col] = pd.to_datetime(df_copy[date_col], format='mixed', dayfirst=True)
-            daily_sales = df_copy.groupby(df_copy[date_col].dt.date)[amount_col].sum().reset_index()
-            
-            return {
-                "chart_type": "line",
-                "chart_name": "Daily Sales Trend",
-                "data": {
-                    "x": [str(d) for d in daily_sales[date_col].tolist()],
-                    "y": daily_sales[amount_col].tolist(),
-                    "type": "scatter",
-                    "mode": "lines+markers",
-                    "name": "Daily Sales",
-                    "marker": {"color": "#636EFA"}
-                },
-                "layout": {
-                    "title": "Daily Sales Analysis",
-                    "xaxis": {"title": "Date"},
-                    "yaxis": {"title": "Total Sales"},
-                    "template": "plotly_white"
-                }
+        daily_sales = _downsample_line(_bucket_sum(days, df[amount_col]))
+        
+        return {
+            "chart_type": "line",
+            "chart_name": "Daily Sales Trend",
+            "data": {
+                "x": daily_sales.index.tolist(),
+                "y": daily_sales.values.tolist(),
+                "type": "scatter",
+                "mode": "lines+markers",
+                "name": "Daily Sales",
+                "marker": {"color": "#636EFA"}
+            },
+            "layout": {
+                "title": "Daily Sales Analysis",
+                "xaxis": {"title": "Date"},
+                "yaxis": {"title": "Total Sales"},
+                "template": "plotly_white"
             }
-        except Exception as e:
-            logger.error(f"Error creating daily sales line: {e}")
-            return None
+        }
     
+    @_safe_chart("monthly revenue")
     def _monthly_revenue(self, df: pd.DataFrame, date_col: str, amount_col: str) -> dict[str, Any]:
         """Generate monthly revenue bar chart data."""
-        try:
-            df_copy = df.copy()
-            df_copy[date_col] = pd.to_datetime(df_copy[date_col], format='mixed', dayfirst=True)
-            monthly = df_copy.groupby(df_copy[date_col].dt.strftime('%Y-%m'))[amount_col].sum().reset_index()
-            
-            return {
-                "chart_type": "bar",
-                "chart_name": "Monthly Revenue",
-                "data": {
-                    "x": monthly[date_col].tolist(),
-                    "y": monthly[amount_col].tolist(),
-                    "type": "bar",
-                    "marker": {
-                        "color": monthly[amount_col].tolist(),
-                        "colorscale": "Viridis"
-                    }
-                },
-                "layout": {
-                    "title": "Monthly Revenue Analysis",
-                    "xaxis": {"title": "Month"},
-                    "yaxis": {"title": "Total Revenue"},
-                    "template": "plotly_white"
+        monthly = _bucket_sum(_date_buckets(df[date_col], 'M'), df[amount_col])
+        
+        return {
+            "chart_type": "bar",
+            "chart_name": "Monthly Revenue",
+            "data": {
+                "x": monthly.index.tolist(),
+                "y": monthly.values.tolist(),
+                "type": "bar",
+                "marker": {
+                    "color": monthly.values.tolist(),
+                    "colorscale": "Viridis"
                 }
+            },
+            "layout": {
+                "title": "Monthly Revenue Analysis",
+                "xaxis": {"title": "Month"},
+                "yaxis": {"title": "Total Revenue"},
+                "template": "plotly_white"
             }
-        except Exception as e:
-            logger.error(f"Error creating monthly revenue: {e}")
-            return None
+        }
     
+    @_safe_chart("weekday analysis")
     def _weekday_analysis(self, df: pd.DataFrame, date_col: str, amount_col: str) -> dict[str, Any]:
         """Generate weekday sales analysis data."""
-        try:
-            df_copy = df.copy()
-            df_copy[date_col] = pd.to_datetime(df_copy[date_col], format='mixed', dayfirst=True)
-            df_copy['weekday'] = df_copy[date_col].dt.day_name()
-            weekday_sales = df_copy.groupby('weekday')[amount_col].sum().reset_index()
-            
-            # Order weekdays properly
-            weekday_order = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-            weekday_sales['weekday'] = pd.Categorical(weekday_sales['weekday'], categories=weekday_order, ordered=True)
-            weekday_sales = weekday_sales.sort_values('weekday')
-            
-            return {
-                "chart_type": "bar",
-                "chart_name": "Sales by Weekday",
-                "data": {
-                    "x": weekday_sales['weekday'].tolist(),
-                    "y": weekday_sales[amount_col].tolist(),
-                    "type": "bar",
-                    "marker": {"color": "#00CC96"}
-                },
-                "layout": {
-                    "title": "Sales by Day of Week",
-                    "xaxis": {"title": "Day"},
-                    "yaxis": {"title": "Total Sales"},
-                    "template": "plotly_white"
-                }
+        # Integer weekday keys (Monday=0) group fast and already sort in weekday order
+        weekday_sales = _group_sum(df[date_col].dt.dayofweek, df[amount_col])
+        weekday_names = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+        weekday_sales.index = [weekday_names[int(day)] for day in weekday_sales.index]
+        
+        return {
+            "chart_type": "bar",
+            "chart_name": "Sales by Weekday",
+            "data": {
+                "x": weekday_sales.index.tolist(),
+                "y": weekday_sales.values.tolist(),
+                "type": "bar",
+                "marker": {"color": "#00CC96"}
+            },
+            "layout": {
+                "title": "Sales by Day of Week",
+                "xaxis": {"title": "Day"},
+                "yaxis": {"title": "Total Sales"},
+                "template": "plotly_white"
             }
-        except Exception as e:
-            logger.error(f"Error creating weekday analysis: {e}")
-            return None
+        }
     
-    def _invoice_trends(self, df: pd.DataFrame, invoice_col: str, date_col: str) -> dict[str, Any]:
+    @_safe_chart("invoice trends")
+    def _invoice_trends(self, df: pd.DataFrame, invoice_col: str, days: np.ndarray) -> dict[str, Any]:
         """Generate invoice count trends data."""
-        try:
-            df_copy = df.copy()
-            df_copy[date_col] = pd.to_datetime(df_copy[date_col], format='mixed', dayfirst=True)
-            daily_invoices = df_copy.groupby(df_copy[date_col].dt.date)[invoice_col].nunique().reset_index()
-            
-            return {
-                "chart_type": "line",
-                "chart_name": "Daily Invoice Count",
-                "data": {
-                    "x": [str(d) for d in daily_invoices[date_col].tolist()],
-                    "y": daily_invoices[invoice_col].tolist(),
-                    "type": "scatter",
-                    "mode": "lines+markers",
-                    "name": "Invoice Count",
-                    "line": {"shape": "spline"},
-                    "marker": {"color": "#FF69B4"}
-                },
-                "layout": {
-                    "title": "Daily Invoice Count",
-                    "xaxis": {"title": "Date"},
-                    "yaxis": {"title": "Number of Invoices", "dtick": 1},
-                    "template": "plotly_white"
-                }
+        daily_invoices = _downsample_line(_group_nunique(pd.Series(days, index=df.index), df[invoice_col]))
+        
+        return {
+            "chart_type": "line",
+            "chart_name": "Daily Invoice Count",
+            "data": {
+                "x": daily_invoices.index.strftime('%Y-%m-%d').tolist(),
+                "y": daily_invoices.values.tolist(),
+                "type": "scatter",
+                "mode": "lines+markers",
+                "name": "Invoice Count",
+                "line": {"shape": "spline"},
+                "marker": {"color": "#FF69B4"}
+            },
+            "layout": {
+                "title": "Daily Invoice Count",
+                "xaxis": {"title": "Date"},
+                "yaxis": {"title": "Number of Invoices", "dtick": 1},
+                "template": "plotly_white"
             }
-        except Exception as e:
-            logger.error(f"Error creating invoice trends: {e}")
-            return None
+        }
     
+    @_safe_chart("products per invoice")
     def _products_per_invoice(self, df: pd.DataFrame, invoice_col: str, product_col: str) -> dict[str, Any]:
         """Generate products per invoice chart data."""
-        try:
-            products_per = df.groupby(invoice_col)[product_col].nunique().reset_index()
-            products_per.columns = [invoice_col, 'num_products']
-            
-            return {
-                "chart_type": "bar",
-                "chart_name": "Products per Invoice",
-                "data": {
-                    "x": products_per[invoice_col].tolist(),
-                    "y": products_per['num_products'].tolist(),
-                    "type": "bar",
-                    "marker": {"color": "#20B2AA"}
-                },
-                "layout": {
-                    "title": "Number of Products per Invoice",
-                    "xaxis": {"title": "Invoice ID"},
-                    "yaxis": {"title": "Products Count"},
-                    "template": "plotly_white"
-                }
+        products_per = _group_nunique(df[invoice_col], df[product_col])
+        if len(products_per) > MAX_BAR_CATEGORIES:
+            # Show the invoices with the most products, still in invoice order
+            products_per = products_per.nlargest(MAX_BAR_CATEGORIES).sort_index()
+        
+        return {
+            "chart_type": "bar",
+            "chart_name": "Products per Invoice",
+            "data": {
+                "x": products_per.index.tolist(),
+                "y": products_per.values.tolist(),
+                "type": "bar",
+                "marker": {"color": "#20B2AA"}
+            },
+            "layout": {
+                "title": "Number of Products per Invoice",
+                "xaxis": {"title": "Invoice ID"},
+                "yaxis": {"title": "Products Count"},
+                "template": "plotly_white"
             }
-        except Exception as e:
-            logger.error(f"Error creating products per invoice: {e}")
-            return None
+        }
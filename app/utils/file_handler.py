@@ -3,21 +3,268 @@ File Handler Utility.
 Manages file operations for session-based storage.
 """
 
+import hashlib
+import io
 import os
 import json
 import shutil
+import threading
+import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
-from typing import Optional
+from typing import AsyncIterator, Optional
 from datetime import datetime
 
+import orjson
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 import aiofiles
+from fastapi import UploadFile
+from google.genai import types
+from PIL import Image, ImageOps
 
 from app.config.settings import settings
 from app.utils.logger import logger
 
 
+def read_csv(file_path: Path, dtype_backend: Optional[str] = None) -> pd.DataFrame:
+    """
+    Parse a CSV file.
+    
+    Args:
+        file_path: Path to the CSV file
+        dtype_backend: 'pyarrow' for Arrow-backed dtypes; by default numeric columns are
+            NumPy-backed, which the chart aggregations reduce directly
+        
+    Returns:
+        Parsed DataFrame
+    """
+    path = str(file_path)
+    if dtype_backend != 'pyarrow':
+        try:
+            # Multithreaded Arrow parse, converted to NumPy-backed columns
+            return pd.read_csv(path, engine='pyarrow')
+        except Exception as e:
+            logger.warning(f"PyArrow CSV engine failed for {path}, using default parser: {e}")
+            return pd.read_csv(path)
+    
+    try:
+        # Multithreaded Arrow reader; strings stay in Arrow buffers instead of Python objects
+        return pd.read_csv(path, engine='pyarrow', dtype_backend='pyarrow')
+    except Exception as e:
+        logger.warning(f"PyArrow CSV engine failed for {path}, using default parser: {e}")
+        return pd.read_csv(path, dtype_backend='pyarrow')
+
+
+@lru_cache(maxsize=16)
+def _read_csv_cached(path: str, mtime_ns: int, dtype_backend: Optional[str]) -> pd.DataFrame:
+    """Parse a CSV file. The modification time is part of the cache key."""
+    return read_csv(Path(path), dtype_backend)
+
+
+def read_csv_cached(file_path: Path, dtype_backend: Optional[str] = None) -> pd.DataFrame:
+    """
+    Read a CSV file, reusing the parsed DataFrame while the file is unchanged.
+    
+    The returned DataFrame is shared between callers and must not be modified in place.
+    
+    Args:
+        file_path: Path to the CSV file
+        dtype_backend: 'pyarrow' to parse with the Arrow engine into Arrow-backed dtypes
+        
+    Returns:
+        Parsed DataFrame
+    """
+    return _read_csv_cached(str(file_path), os.stat(file_path).st_mtime_ns, dtype_backend)
+
+
+@lru_cache(maxsize=16)
+def _read_parquet_cached(path: str, mtime_ns: int, columns: Optional[tuple[str, ...]]) -> pd.DataFrame:
+    """Read (a projection of) a Parquet file. The modification time is part of the cache key."""
+    return pd.read_parquet(path, engine='pyarrow', columns=list(columns) if columns else None)
+
+
+# Shared pool for reading invoice image files
+_image_executor = ThreadPoolExecutor(
+    max_workers=min(32, (os.cpu_count() or 1) * 2), thread_name_prefix="img"
+)
+
+IMAGE_MIME_TYPES = {'.jpg': 'image/jpeg', '.jpeg': 'image/jpeg', '.png': 'image/png'}
+IMAGE_EXTENSIONS = tuple(IMAGE_MIME_TYPES)
+
+
+def _downscale_image(data: bytes, max_edge: int) -> Optional[bytes]:
+    """
+    Re-encode an image as JPEG with its longer edge capped at max_edge.
+    
+    Returns None when the image is already small enough, so its original bytes are sent.
+    """
+    with Image.open(io.BytesIO(data)) as img:  # Lazy: only the header has been read here
+        if max(img.size) <= max_edge:
+            return None
+        # For JPEGs, libjpeg decodes directly at a reduced scale (1/2, 1/4, 1/8)
+        img.draft('RGB', (max_edge, max_edge))
+        # The re-encoded JPEG carries no EXIF, so apply the camera orientation to the pixels
+        img = ImageOps.exif_transpose(img)
+        if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
+            # Composite transparency onto white instead of exposing the hidden color channels
+            rgba = img.convert('RGBA')
+            img = Image.new('RGB', rgba.size, 'white')
+            img.paste(rgba, mask=rgba.getchannel('A'))
+        else:
+            img = img.convert('RGB')
+    img.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+    
+    buffer = io.BytesIO()
+    img.save(buffer, 'JPEG', quality=80)
+    return buffer.getvalue()
+
+
+def _read_image_part(file_path: Path) -> Optional[types.Part]:
+    """Read one image file as an inline Gemini part, returning None if it cannot be read."""
+    try:
+        with open(file_path, 'rb') as f:
+            data = f.read()
+        mime_type = IMAGE_MIME_TYPES[file_path.suffix.lower()]
+        
+        # Image tokens scale with pixel area; oversized scans are shrunk before upload
+        if settings.max_image_edge_px > 0:
+            downscaled = _downscale_image(data, settings.max_image_edge_px)
+            if downscaled is not None:
+                data, mime_type = downscaled, 'image/jpeg'
+        
+        logger.debug("Loaded image: %s", file_path.name)  # Lazy args: no formatting unless DEBUG
+        return types.Part.from_bytes(data=data, mime_type=mime_type)
+    except Exception as e:
+        logger.warning(f"Failed to load image '{file_path.name}': {e}")
+        return None
+
+
+def load_image_parts(paths: list[Path]) -> list[types.Part]:
+    """
+    Read image files in parallel as Gemini parts, preserving their order.
+    
+    Encoded file bytes are sent as-is unless the image exceeds max_image_edge_px, so
+    typical invoices are never decoded and re-encoded. Byte-identical files (re-uploads
+    of the same invoice) are included once, so Gemini is not paid to read them twice.
+    
+    Args:
+        paths: Image file paths (.jpg, .jpeg or .png)
+        
+    Returns:
+        Image parts; files that cannot be read are skipped
+    """
+    parts = []
+    seen = set()
+    for file_path, part in zip(paths, _image_executor.map(_read_image_part, paths)):
+        if part is None:
+            continue
+        digest = hashlib.blake2b(part.inline_data.data, digest_size=16).digest()
+        if digest in seen:
+            logger.info(f"Skipping duplicate image: {file_path.name}")
+            continue
+        seen.add(digest)
+        parts.append(part)
+    
+    logger.info(f"Loaded {len(parts)}/{len(paths)} images")
+    return parts
+
+
+def _rows_to_frame(rows: list[dict]) -> pd.DataFrame:
+    """
+    Build a DataFrame from row dicts column-at-a-time through Arrow.
+    
+    Falls back to pandas when Arrow cannot infer the rows: a column mixing numbers and
+    strings, or keys missing from the first row (Arrow takes the columns from it).
+    """
+    try:
+        table = pa.Table.from_pylist(rows)
+        if table.num_columns == len({key for row in rows for key in row}):
+            return table.to_pandas()
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        pass
+    return pd.DataFrame(rows)
+
+
+INVOICE_NUMERIC_COLUMNS = ('quantity', 'unit_price', 'total_price')
+
+# First unsigned number in a string such as "1 Set" or "1.5e3" (separators and symbols removed first)
+_NUMBER_PATTERN = r'(\d*\.?\d+(?:[eE][-+]?\d+)?)'
+# A minus before any digit ("-$5", "$-5") or an amount wrapped in parentheses ("(5.00)")
+_NEGATIVE_PATTERN = r'^\W*-|^\W*\(.*\d.*\)\W*$'
+# A comma followed by one or two final digits is a decimal comma ("1,5"), not a thousands separator
+_DECIMAL_COMMA_PATTERN = r'(?<![\d,.])(\d+),(\d{1,2})(?![\d,.])'
+_SYMBOLS_PATTERN = r'[\s$€£¥₹()]'
+
+
+def _parse_number_strings(values: pd.Series) -> pd.Series:
+    """Parse numbers written as text, e.g. "$1,234.50" -> 1234.5, "(5.00)" -> -5.0, "1,5" -> 1.5."""
+    text = values.astype(str).str.strip()
+    negative = text.str.contains(_NEGATIVE_PATTERN, regex=True)
+    text = (
+        text.str.replace(_SYMBOLS_PATTERN, '', regex=True)
+        .str.replace(_DECIMAL_COMMA_PATTERN, r'\1.\2', regex=True)
+        .str.replace(',', '', regex=False)
+    )
+    numbers = pd.to_numeric(text.str.extract(_NUMBER_PATTERN, expand=False), errors='coerce')
+    return numbers.mask(negative, -numbers)
+
+
+def _coerce_invoice_numbers(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Normalize the numeric fields of AI-extracted invoice rows.
+    
+    Numbers returned as strings (e.g. "3,000.35", "-$20" or "(5.00)") are parsed, unit
+    prices the model left out are derived from total / quantity, and prices are rounded
+    to cents.
+    """
+    present = [col for col in INVOICE_NUMERIC_COLUMNS if col in df.columns]
+    for col in present:
+        values = df[col]
+        if pd.api.types.is_numeric_dtype(values):
+            df[col] = pd.to_numeric(values, errors='coerce')
+        else:
+            df[col] = _parse_number_strings(values)
+    
+    if len(present) == len(INVOICE_NUMERIC_COLUMNS):
+        derived = df['total_price'] / df['quantity'].where(df['quantity'] != 0)
+        df['unit_price'] = df['unit_price'].fillna(derived)
+    for col in ('unit_price', 'total_price'):
+        if col in present:
+            df[col] = df[col].round(2)
+    return df
+
+
+# Single background worker for emptying the trash; concurrent deletes share one pending purge
+_purge_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="purge")
+_purge_lock = threading.Lock()
+_purge_pending = False
+
+
+def _schedule_trash_purge(trash_dir: Path):
+    """Queue a purge of the trash directory unless one is already waiting to run."""
+    global _purge_pending
+    with _purge_lock:
+        if _purge_pending:
+            return
+        _purge_pending = True
+    _purge_executor.submit(_purge_trash, trash_dir)
+
+
+def _purge_trash(trash_dir: Path):
+    """Delete everything in the trash directory (runs on the purge worker)."""
+    global _purge_pending
+    with _purge_lock:
+        # Cleared before scanning: anything trashed after this point is either seen below
+        # or schedules the next purge
+        _purge_pending = False
+    for entry in trash_dir.iterdir():
+        shutil.rmtree(entry, ignore_errors=True)
+
+
 class FileHandler:
     """
     Handles file operations for a specific session.
@@ -44,18 +291,60 @@ class FileHandler:
         """Get the upload directory for this session."""
         return self.session_dir / "uploads"
     
+    def list_upload_images(self) -> list[Path]:
+        """
+        List the invoice image files in the upload directory.
+        
+        Uses os.scandir, whose entries carry the file type, so no extra stat per file is needed.
+        
+        Returns:
+            Image file paths sorted by name, so requests and their cache keys do not
+            depend on directory order
+        """
+        upload_dir = self.get_upload_dir()
+        try:
+            with os.scandir(upload_dir) as entries:
+                return sorted(
+                    Path(entry.path) for entry in entries
+                    if entry.is_file() and entry.name.lower().endswith(IMAGE_EXTENSIONS)
+                )
+        except FileNotFoundError:
+            logger.warning(f"Upload directory missing: {upload_dir}")
+            return []
+    
+    def load_upload_images(self) -> list[types.Part]:
+        """
+        Load all invoice images in the upload directory as inline Gemini parts.
+        
+        Returns:
+            Image parts (raw file bytes); unreadable files are skipped
+        """
+        return load_image_parts(self.list_upload_images())
+    
     def get_data_file(self) -> Path:
         """Get the path to the processed data CSV file."""
         return self.session_dir / "invoice_data.csv"
     
+    def get_parquet_data_file(self) -> Path:
+        """Get the path to the columnar (Parquet) copy of the processed data."""
+        return self.session_dir / "invoice_data.parquet"
+    
     def get_report_file(self) -> Path:
         """Get the path to the generated report file."""
         return self.session_dir / "report.md"
+    
+    def get_llm_cache_dir(self) -> Path:
+        """Get the directory of stored Gemini responses (removed with the session)."""
+        return self.session_dir / ".llm_cache"
 
     def get_visualization_file(self) -> Path:
         """Get the path to the generated visualization file (HTML)."""
         return self.session_dir / "chart.html"
     
+    def new_visualization_file(self) -> Path:
+        """Get a unique scratch path for a single code execution to write its chart to."""
+        return self.session_dir / f"chart_{uuid.uuid4().hex[:8]}.html"
+    
     def get_metadata_file(self) -> Path:
         """Get the path to the session metadata file."""
         return self.session_dir / "metadata.json"
@@ -86,6 +375,31 @@ class FileHandler:
         logger.info(f"Saved upload: {safe_filename} in session {self.session_id}")
         return file_path
     
+    async def save_upload_stream(self, upload_file: UploadFile, filename: str, chunk_size: int = 1 << 20) -> Path:
+        """
+        Stream an uploaded file to disk in fixed-size chunks.
+        
+        Peak memory stays at one chunk instead of the whole file.
+        
+        Args:
+            upload_file: Incoming upload to read from
+            filename: Original filename
+            chunk_size: Bytes read per chunk (default 1 MiB)
+            
+        Returns:
+            Path to saved file
+        """
+        safe_filename = self._sanitize_filename(filename)
+        file_path = self.get_upload_dir() / safe_filename
+        
+        await upload_file.seek(0)
+        async with aiofiles.open(file_path, 'wb') as f:
+            while chunk := await upload_file.read(chunk_size):
+                await f.write(chunk)
+        
+        logger.info(f"Saved upload: {safe_filename} in session {self.session_id}")
+        return file_path
+    
     def save_upload_file_sync(self, file_content: bytes, filename: str) -> Path:
         """
         Save an uploaded file synchronously.
@@ -106,6 +420,32 @@ class FileHandler:
         logger.info(f"Saved upload: {safe_filename} in session {self.session_id}")
         return file_path
     
+    def unique_upload_names(self, filenames: list[str]) -> list[str]:
+        """
+        Sanitize a batch of upload filenames, suffixing any that would share a path.
+        
+        Names are compared case-insensitively, since case-insensitive filesystems map
+        "A.jpg" and "a.jpg" to the same file.
+        
+        Args:
+            filenames: Original filenames, in upload order
+            
+        Returns:
+            Distinct safe filenames, e.g. ["scan.jpg", "scan_1.jpg"]
+        """
+        used = set()
+        unique_names = []
+        for filename in filenames:
+            name = self._sanitize_filename(filename)
+            stem, ext = os.path.splitext(name)
+            counter = 0
+            while name.lower() in used:
+                counter += 1
+                name = f"{stem}_{counter}{ext}"
+            used.add(name.lower())
+            unique_names.append(name)
+        return unique_names
+    
     def _sanitize_filename(self, filename: str) -> str:
         """Sanitize filename to prevent path traversal attacks."""
         # Remove any path components
@@ -115,6 +455,20 @@ class FileHandler:
             filename = filename.replace(char, '_')
         return filename
     
+    def get_data_version(self) -> tuple[tuple[str, int], ...]:
+        """
+        Get a fingerprint of the session's tabular data files.
+        
+        Covers uploaded CSVs and processed invoice data; it changes whenever any of
+        them is written, so it can key caches of derived results.
+        
+        Returns:
+            Tuple of (path, mtime_ns) pairs
+        """
+        data_files = sorted(self.get_upload_dir().glob("*.csv"))
+        data_files.append(self.get_data_file())
+        return tuple((str(f), f.stat().st_mtime_ns) for f in data_files if f.exists())
+    
     def get_uploaded_files(self) -> list[str]:
         """Get list of uploaded filenames."""
         upload_dir = self.get_upload_dir()
@@ -133,26 +487,76 @@ class FileHandler:
             Path to saved CSV file
         """
         file_path = self.get_data_file()
-        df = pd.DataFrame(data)
+        parquet_path = self.get_parquet_data_file()
+        df = _coerce_invoice_numbers(_rows_to_frame(data))
+        
+        # The exported CSV keeps pandas formatting (True/False, minimal quoting)
         df.to_csv(file_path, index=False)
+        try:
+            # Columnar copy so readers can load only the columns they need
+            pq.write_table(pa.Table.from_pandas(df, preserve_index=False), parquet_path, compression='zstd')
+        except (pa.ArrowInvalid, pa.ArrowTypeError) as e:
+            # Mixed-type columns from the AI output cannot always be stored; CSV stays the source
+            parquet_path.unlink(missing_ok=True)
+            logger.warning(f"Could not write Parquet copy of invoice data: {e}")
         
         logger.info(f"Saved invoice data: {len(data)} items to {file_path}")
         return file_path
     
-    def load_invoice_data(self) -> list[dict]:
+    def load_invoice_frame(self, columns: Optional[list[str]] = None) -> Optional[pd.DataFrame]:
         """
-        Load processed invoice data from CSV.
+        Load processed invoice data as a DataFrame.
+        
+        Reads the Parquet copy when available (decoding only the requested columns),
+        falling back to the CSV file.
         
+        Args:
+            columns: Optional subset of columns to load
+            
         Returns:
-            List of invoice dictionaries
+            Cached DataFrame (do not modify in place) or None if not found
         """
+        parquet_path = self.get_parquet_data_file()
+        if parquet_path.exists():
+            return _read_parquet_cached(
+                str(parquet_path),
+                os.stat(parquet_path).st_mtime_ns,
+                tuple(columns) if columns else None,
+            )
+        
         file_path = self.get_data_file()
         
         if not file_path.exists():
             logger.warning(f"Invoice data file not found: {file_path}")
-            return []
+            return None
+        
+        df = read_csv_cached(file_path)
+        return df[columns] if columns else df
+    
+    def get_invoice_columns(self) -> list[str]:
+        """
+        Get the column names of the processed invoice data without loading it.
+        
+        Returns:
+            List of column names (empty if no data)
+        """
+        parquet_path = self.get_parquet_data_file()
+        if parquet_path.exists():
+            return pq.read_schema(parquet_path).names
+        
+        df = self.load_invoice_frame()
+        return [] if df is None else df.columns.tolist()
+    
+    def load_invoice_data(self) -> list[dict]:
+        """
+        Load processed invoice data from CSV.
         
-        df = pd.read_csv(file_path)
+        Returns:
+            List of invoice dictionaries
+        """
+        df = self.load_invoice_frame()
+        if df is None:
+            return []
         return df.to_dict(orient='records')
     
     def save_report(self, report_text: str) -> Path:
@@ -173,6 +577,35 @@ class FileHandler:
         logger.info(f"Saved report to {file_path}")
         return file_path
     
+    async def save_report_stream(self, chunks: AsyncIterator[str]) -> str:
+        """
+        Write a report to file while it is being generated.
+        
+        Chunks go to a temporary file that replaces the report only once the stream
+        completes, so a failed generation leaves the previous report intact.
+        
+        Args:
+            chunks: Report text pieces in markdown
+            
+        Returns:
+            The complete report text
+        """
+        file_path = self.get_report_file()
+        tmp_path = file_path.with_suffix(f".{uuid.uuid4().hex[:8]}.tmp")
+        parts = []
+        try:
+            async with aiofiles.open(tmp_path, 'w', encoding='utf-8') as f:
+                async for chunk in chunks:
+                    parts.append(chunk)
+                    await f.write(chunk)
+            os.replace(tmp_path, file_path)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+        
+        logger.info(f"Saved report to {file_path}")
+        return "".join(parts)
+    
     def load_report(self) -> str:
         """
         Load generated report from file.
@@ -191,13 +624,13 @@ class FileHandler:
     
     def save_metadata(self, metadata: dict):
         """Save session metadata."""
-        metadata['updated_at'] = datetime.now().isoformat()
+        metadata['updated_at'] = datetime.now()
         if 'created_at' not in metadata:
-            metadata['created_at'] = datetime.now().isoformat()
+            metadata['created_at'] = metadata['updated_at']
         
         file_path = self.get_metadata_file()
-        with open(file_path, 'w') as f:
-            json.dump(metadata, f, indent=2)
+        with open(file_path, 'wb') as f:
+            f.write(orjson.dumps(metadata, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY))
 
     def get_chat_history_file(self) -> Path:
         """Get the path to the chat history file."""
@@ -229,8 +662,8 @@ class FileHandler:
         if not file_path.exists():
             return {}
         
-        with open(file_path, 'r') as f:
-            return json.load(f)
+        with open(file_path, 'rb') as f:
+            return orjson.loads(f.read())
     
     def get_session_info(self) -> dict:
         """Get session information."""
@@ -248,7 +681,13 @@ class FileHandler:
         """Delete all session files and directory."""
         try:
             if self.session_dir.exists():
-                shutil.rmtree(self.session_dir)
+                # Renaming is a single metadata operation; the per-file unlinks happen off the request path
+                trash_dir = settings.storage_dir / ".trash"
+                trash_dir.mkdir(parents=True, exist_ok=True)
+                os.rename(self.session_dir, trash_dir / f"{self.session_id}.{time.time_ns()}")
+                _schedule_trash_purge(trash_dir)
+                _read_csv_cached.cache_clear()
+                _read_parquet_cached.cache_clear()
                 logger.info(f"Cleaned up session: {self.session_id}")
         except Exception as e:
             logger.error(f"Error cleaning up session {self.session_id}: {e}")
@@ -0,0 +1,96 @@
+"""
+LLM Response Cache.
+Stores Gemini responses in the session directory, keyed by the prompt and the bytes of
+the input files, so re-processing the same invoices skips the API round-trip. Entries
+expire after a TTL, each session keeps a bounded number of them, and deleting the
+session deletes its cache.
+"""
+
+import hashlib
+import os
+import time
+import uuid
+from pathlib import Path
+from typing import Iterable, Optional
+
+from app.config.settings import settings
+from app.utils.logger import logger
+
+
+def response_cache_key(prompt: str, blobs: Iterable[bytes], **params) -> str:
+    """
+    Build a cache key for a Gemini request.
+
+    Args:
+        prompt: Prompt text sent to the model
+        blobs: Bytes of the inline files attached to the request, in request order
+        **params: Generation parameters that affect the response (e.g. temperature)
+
+    Returns:
+        Hex BLAKE2b digest identifying the request
+    """
+    # BLAKE2b is faster than SHA-256 on 64-bit CPUs and is in the standard library
+    digest = hashlib.blake2b(f"{settings.gemini_model}\0{prompt}".encode(), digest_size=32)
+    for name in sorted(params):
+        digest.update(f"\0{name}={params[name]}".encode())
+    for blob in blobs:
+        digest.update(hashlib.blake2b(blob, digest_size=32).digest())
+    return digest.hexdigest()
+
+
+def get_cached_response(cache_dir: Path, key: str) -> Optional[str]:
+    """
+    Look up a stored response. Entries older than the TTL are deleted and count as a miss.
+
+    Args:
+        cache_dir: Session cache directory (FileHandler.get_llm_cache_dir())
+        key: Key from response_cache_key()
+
+    Returns:
+        The stored response text, or None on a miss or when caching is disabled
+    """
+    if not settings.llm_cache_enabled:
+        return None
+    entry = cache_dir / f"{key}.txt"
+    try:
+        if time.time() - entry.stat().st_mtime > settings.llm_cache_ttl_hours * 3600:
+            entry.unlink(missing_ok=True)
+            return None
+        text = entry.read_text(encoding="utf-8")
+    except FileNotFoundError:
+        return None
+    logger.info(f"LLM cache hit: {key[:12]}")
+    return text
+
+
+def put_cached_response(cache_dir: Path, key: str, response: str):
+    """
+    Store a response, evicting the oldest entries beyond the per-session limit.
+
+    Written to a temp file and renamed, so readers never see partial entries.
+
+    Args:
+        cache_dir: Session cache directory (FileHandler.get_llm_cache_dir())
+        key: Key from response_cache_key()
+        response: Response text to store
+    """
+    if not settings.llm_cache_enabled:
+        return
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = cache_dir / f"{key}.{uuid.uuid4().hex}.tmp"
+        tmp_path.write_text(response, encoding="utf-8")
+        os.replace(tmp_path, cache_dir / f"{key}.txt")
+        _evict_oldest(cache_dir)
+    except OSError as e:
+        logger.warning(f"Failed to store LLM cache entry {key[:12]}: {e}")
+
+
+def _evict_oldest(cache_dir: Path):
+    """Delete the least recently written entries beyond settings.llm_cache_max_entries."""
+    with os.scandir(cache_dir) as entries:
+        stored = [(entry.stat().st_mtime, entry.path) for entry in entries if entry.name.endswith(".txt")]
+    excess = len(stored) - settings.llm_cache_max_entries
+    if excess > 0:
+        for _, path in sorted(stored)[:excess]:
+            Path(path).unlink(missing_ok=True)
@@ -36,7 +36,7 @@ const Reports: React.FC = () => {
         if (!sessionId) return;
         setGenerating(true);
         try {
-            const res = await AnalyticsService.generateReport(sessionId);
+            const res = await AnalyticsService.generateReport(sessionId, Boolean(report));
             setReport(res.data.report);
         } catch (error) {
             console.error("Failed to generate report", error);
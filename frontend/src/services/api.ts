@@ -35,8 +35,8 @@ export const InvoiceService = {
 };
 
 export const AnalyticsService = {
-    generateReport: async (sessionId: string) => {
-        return api.post<{ report: string }>(`/reports/generate/${sessionId}`);
+    generateReport: async (sessionId: string, regenerate = false) => {
+        return api.post<{ report: string }>(`/reports/generate/${sessionId}`, null, { params: { regenerate } });
     },
 
     getReport: async (sessionId: string) => {
@@ -0,0 +1,5 @@
+"""Shared test configuration: settings require an API key, but tests never call the API."""
+
+import os
+
+os.environ.setdefault("GOOGLE_API_KEY", "test-key")
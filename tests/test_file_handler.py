@@ -0,0 +1,42 @@
+"""Tests for invoice number normalization in the file handler."""
+
+import pandas as pd
+import pytest
+
+from app.utils.file_handler import _coerce_invoice_numbers
+
+
+@pytest.mark.parametrize(
+    ("raw", "expected"),
+    [
+        ("-$5", -5.0),
+        ("$-5", -5.0),
+        ("(5.00)", -5.0),
+        ("$1,234.50", 1234.5),
+        ("1,5", 1.5),
+        ("3,000.35", 3000.35),
+        ("$20", 20.0),
+        ("not a number", None),
+    ],
+)
+def test_price_strings_are_parsed(raw, expected):
+    df = _coerce_invoice_numbers(pd.DataFrame({"total_price": [raw]}))
+    value = df["total_price"].iloc[0]
+    if expected is None:
+        assert pd.isna(value)
+    else:
+        assert value == pytest.approx(expected)
+
+
+def test_quantity_units_are_ignored():
+    df = _coerce_invoice_numbers(pd.DataFrame({"quantity": ["1 Set", "2 Each"]}))
+    assert df["quantity"].tolist() == [1, 2]
+
+
+def test_missing_unit_price_is_derived():
+    df = _coerce_invoice_numbers(pd.DataFrame({
+        "quantity": ["4"],
+        "unit_price": [None],
+        "total_price": ["$10.00"],
+    }))
+    assert df["unit_price"].iloc[0] == pytest.approx(2.5)
@@ -0,0 +1,78 @@
+"""Tests for GeminiService streaming retries."""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import gemini_service
+from app.services.gemini_service import GeminiService
+
+
+class _FakeModels:
+    """Stands in for client.aio.models; each stream fails on its first step for the first `failures` calls."""
+
+    def __init__(self, failures: int, fail_after_first_chunk: bool = False):
+        self.failures = failures
+        self.fail_after_first_chunk = fail_after_first_chunk
+        self.calls = 0
+
+    async def generate_content_stream(self, **kwargs):
+        self.calls += 1
+        failing = self.calls <= self.failures
+
+        async def stream():
+            if failing and not self.fail_after_first_chunk:
+                raise ConnectionError("503 unavailable")
+            yield SimpleNamespace(text="Hello")
+            if failing:
+                raise ConnectionError("connection reset")
+            yield SimpleNamespace(text=" world")
+
+        return stream()
+
+
+def _service(models: _FakeModels) -> GeminiService:
+    service = GeminiService()
+    service.client = SimpleNamespace(aio=SimpleNamespace(models=models))
+    return service
+
+
+async def _collect(service: GeminiService, **kwargs) -> list:
+    return [text async for text in service.generate_content_stream("prompt", **kwargs)]
+
+
+@pytest.fixture(autouse=True)
+def _no_backoff(monkeypatch):
+    async def sleep(_seconds):
+        pass
+
+    monkeypatch.setattr(gemini_service.asyncio, "sleep", sleep)
+
+
+def test_stream_retries_error_raised_on_first_step():
+    models = _FakeModels(failures=2)
+    chunks = asyncio.run(_collect(_service(models)))
+    assert chunks == ["Hello", " world"]
+    assert models.calls == 3
+
+
+def test_stream_gives_up_after_max_retries():
+    models = _FakeModels(failures=5)
+    with pytest.raises(RuntimeError, match="after 3 retries"):
+        asyncio.run(_collect(_service(models)))
+    assert models.calls == 3
+
+
+def test_stream_does_not_retry_after_yielding():
+    models = _FakeModels(failures=1, fail_after_first_chunk=True)
+    received = []
+
+    async def consume():
+        async for text in _service(models).generate_content_stream("prompt"):
+            received.append(text)
+
+    with pytest.raises(RuntimeError, match="stream error"):
+        asyncio.run(consume())
+    assert received == ["Hello"]
+    assert models.calls == 1